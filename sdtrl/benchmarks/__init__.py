@@ -0,0 +1,25 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmarks for the engine's hot paths - map generation, FOV, rendering and
+ticking - on seeded, repeatable scenarios.
+
+Run from the `sdtrl` directory with `python -m benchmarks --help`.
+"""
+from .suite import Scenario, SCENARIOS, run_suite, compare
+
+__all__ = ['Scenario', 'SCENARIOS', 'run_suite', 'compare']
@@ -0,0 +1,73 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import sys
+
+from .suite import SCENARIOS, PHASES, run_suite, compare
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Benchmark map generation, FOV, rendering and ticking."
+    )
+    parser.add_argument('-s', '--scenario', action='append',
+                        choices=[scenario.name for scenario in SCENARIOS],
+                        help="Scenario to run (default: all)")
+    parser.add_argument('-p', '--phase', action='append',
+                        choices=list(PHASES),
+                        help="Phase to run (default: all)")
+    parser.add_argument('-n', '--repeat', type=int, default=20,
+                        help="Timed runs per phase")
+    parser.add_argument('-o', '--output',
+                        help="Write the JSON report here instead of stdout")
+    parser.add_argument('-b', '--baseline',
+                        help="JSON report to compare against")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help="Allowed slowdown against the baseline, as a "
+                             "fraction (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not args.scenario or scenario.name in args.scenario]
+    report = run_suite(scenarios, args.phase or tuple(PHASES), args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressed = False
+    for row in compare(report, baseline, args.tolerance):
+        regressed |= row['regression']
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['scenario']:>8} {row['phase']:<20} "
+              f"{row['baseline_ms']:9.3f}ms -> {row['median_ms']:9.3f}ms "
+              f"({row['ratio']:.2f}x){flag}",
+              file=sys.stderr)
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+import gc
+import platform
+import random
+import tracemalloc
+from statistics import median
+from time import perf_counter
+from typing import NamedTuple, Callable, Dict, List, Iterable, Any
+
+import numpy as np
+
+from constants import __version__
+from game.game import SevenDaysToRigel
+from game.entities import Creature
+from game.world import World
+
+__all__ = ['Scenario', 'SCENARIOS', 'PHASES', 'run_suite', 'compare']
+
+
+class Scenario(NamedTuple):
+    name: str
+    width: int
+    height: int
+    entities: int
+    seed: int = 7
+
+
+SCENARIOS = (
+    Scenario('small', 80, 50, 10),
+    Scenario('medium', 160, 100, 100),
+    Scenario('large', 320, 200, 1000),
+)
+
+
+def make_game(scenario: Scenario) -> SevenDaysToRigel:
+    """
+    Start a headless game on a seeded world, with the scenario's crowd of
+    entities scattered randomly over it.
+    """
+    random.seed(scenario.seed)
+    game = SevenDaysToRigel(headless=True)
+    game.WORLD_WIDTH = scenario.width
+    game.WORLD_HEIGHT = scenario.height
+    game.MYSTERY_WORKERS = 1
+    game.ui.start_game()
+    rng = random.Random(scenario.seed)
+    for _ in range(scenario.entities):
+        game.world.add_entity(Creature(
+            name="crewmate", description="A benchmark.",
+            location=(rng.randrange(scenario.width),
+                      rng.randrange(scenario.height)),
+            character=ord('c')
+        ))
+    return game
+
+
+def random_cells(scenario: Scenario, count: int) -> List[tuple]:
+    rng = random.Random(scenario.seed)
+    return [(rng.randrange(scenario.width), rng.randrange(scenario.height))
+            for _ in range(count)]
+
+
+# Every phase takes a scenario and returns the function to time. Setup that
+# shouldn't be measured happens before returning.
+
+def phase_generate(scenario: Scenario) -> Callable:
+    def generate():
+        random.seed(scenario.seed)
+        World(scenario.width, scenario.height).generate_map()
+    return generate
+
+
+def phase_fov(scenario: Scenario) -> Callable:
+    game = make_game(scenario)
+    viewers = random_cells(scenario, 20)
+
+    def fov():
+        game.world.fov.invalidate()
+        for viewer in viewers:
+            game.world.fov.compute(viewer)
+    return fov
+
+
+def phase_lookup(scenario: Scenario) -> Callable:
+    world = make_game(scenario).world
+    cells = random_cells(scenario, 1000)
+
+    def lookup():
+        for cell in cells:
+            world @ cell
+    return lookup
+
+
+def phase_render_full(scenario: Scenario) -> Callable:
+    return make_game(scenario).ui.compose_frame
+
+
+def phase_render_incremental(scenario: Scenario) -> Callable:
+    """
+    One entity moves per frame, so only a couple of cells need redrawing.
+    """
+    game = make_game(scenario)
+    entity = game.world.entities[-1]
+    game.ui.draw_game()
+    steps = [(1, 0), (-1, 0)]
+
+    def render_incremental():
+        entity.move(*steps[0])
+        steps.reverse()
+        game.ui.draw_game()
+    return render_incremental
+
+
+def phase_tick(scenario: Scenario) -> Callable:
+    """
+    A full frame of the main loop with a tenth of the crowd walking around.
+    """
+    game = make_game(scenario)
+    rng = random.Random(scenario.seed)
+    walkers = game.world.entities[:max(1, len(game.world.entities) // 10)]
+
+    def tick():
+        for walker in walkers:
+            walker.move(rng.randint(-1, 1), rng.randint(-1, 1))
+        game.ui.step()
+    return tick
+
+
+PHASES: Dict[str, Callable[[Scenario], Callable]] = {
+    'generate': phase_generate,
+    'fov': phase_fov,
+    'lookup': phase_lookup,
+    'render_full': phase_render_full,
+    'render_incremental': phase_render_incremental,
+    'tick': phase_tick,
+}
+
+
+def measure(function: Callable, repeat: int) -> Dict[str, float]:
+    """
+    Time a function `repeat` times, then run it once more under tracemalloc
+    for its peak memory use - separately, since tracing slows everything
+    down.
+    """
+    function()  # Warm up caches
+    gc.collect()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'min_ms': min(times) * 1000,
+        'median_ms': median(times) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def run_suite(scenarios: Iterable[Scenario] = SCENARIOS,
+              phases: Iterable[str] = tuple(PHASES),
+              repeat: int = 20) -> Dict[str, Any]:
+    """
+    Run every phase on every scenario.
+    :return: A JSON-serializable report
+    """
+    scenarios = list(scenarios)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for scenario in scenarios:
+        results[scenario.name] = {
+            phase: measure(PHASES[phase](scenario), repeat)
+            for phase in phases
+        }
+    return {
+        'meta': {
+            'version': __version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'scenarios': [scenario._asdict() for scenario in scenarios],
+        },
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Compare the median times of a report against a baseline report.
+    :param tolerance: How much slower than the baseline a phase can get
+        before it counts as a regression, as a fraction
+    :return: One row per phase found in both reports
+    """
+    rows = []
+    for scenario, phases in report['results'].items():
+        for phase, result in phases.items():
+            try:
+                before = baseline['results'][scenario][phase]['median_ms']
+            except KeyError:
+                continue
+            after = result['median_ms']
+            ratio = after / before if before else float('inf')
+            rows.append({
+                'scenario': scenario,
+                'phase': phase,
+                'baseline_ms': before,
+                'median_ms': after,
+                'ratio': ratio,
+                'regression': ratio > 1 + tolerance,
+            })
+    return rows
@@ -16,12 +16,19 @@
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from tcod import Color
 from .game import BaseGame, BaseWorld
-from .helpers import Point, Map, Color, CellContents, MemorizedCell, \
-    Pointlike, SplashScreen
+from .helpers import Point, MutablePoint, Map, Color, CellContents, \
+    MemorizedCell, Pointlike, SplashScreen, SparseOverlay
 from .entities import Entity
-from .tiles import Tile
+from .tiles import Tile, TileRegistry, TILES
+from .memory import MemoryLayer
+from .persistence import save_world, load_world, Autosaver, SaveError
+from .decks import Decks
+from .profiling import PROFILER, Profiler, profiled
 from .ui import UI
 
-__all__ = ['BaseGame', 'Map', 'Entity', 'Tile', 'UI', 'BaseWorld',
-           'SplashScreen',
+__all__ = ['BaseGame', 'Map', 'Entity', 'Tile', 'TileRegistry', 'TILES',
+           'SparseOverlay', 'MemoryLayer', 'UI', 'BaseWorld',
+           'save_world', 'load_world', 'Autosaver', 'SaveError', 'Decks',
+           'PROFILER', 'Profiler', 'profiled',
+           'SplashScreen', 'Point', 'MutablePoint',
            'Color', 'CellContents', 'MemorizedCell', 'Pointlike']
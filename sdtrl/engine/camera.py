@@ -0,0 +1,76 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    from .helpers import Pointlike
+
+__all__ = ['Camera']
+
+
+class Camera:
+    """
+    The part of the map that's on the screen.
+
+    (x, y) is the map cell shown in the upper left corner of the screen.
+    The camera keeps its target in the middle of the screen, except near
+    the edges of the map, where it stops so as not to show anything past
+    them. Maps smaller than the screen are drawn from the upper left corner.
+    """
+    __slots__ = ['width', 'height', 'x', 'y']
+
+    def __init__(self, width: int, height: int):
+        """
+        :param width: Width of the screen, in cells
+        :param height: Height of the screen, in cells
+        """
+        self.width: int = width
+        self.height: int = height
+        self.x: int = 0
+        self.y: int = 0
+
+    def follow(self, target: Pointlike,
+               map_width: int, map_height: int) -> bool:
+        """
+        Center the camera on a point.
+        :return: Whether the camera moved
+        """
+        x = min(max(target[0] - self.width // 2, 0),
+                max(map_width - self.width, 0))
+        y = min(max(target[1] - self.height // 2, 0),
+                max(map_height - self.height, 0))
+        moved = (x, y) != (self.x, self.y)
+        self.x = x
+        self.y = y
+        return moved
+
+    def view(self, map_width: int,
+             map_height: int) -> Tuple[int, int, int, int]:
+        """
+        Get the (x, y, width, height) rectangle of the map that's on the
+        screen.
+        """
+        return (self.x, self.y,
+                max(min(self.width, map_width - self.x), 0),
+                max(min(self.height, map_height - self.y), 0))
+
+    def to_screen(self, where: Pointlike) -> Tuple[int, int]:
+        return where[0] - self.x, where[1] - self.y
+
+    def to_map(self, where: Pointlike) -> Tuple[int, int]:
+        return where[0] + self.x, where[1] + self.y
@@ -0,0 +1,227 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Worlds too big to keep in memory at once, split into decks.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING, Callable, Type, Union, Dict, Set, \
+    Iterable, List, Optional
+
+from .persistence import Autosaver, load_world
+
+if TYPE_CHECKING:
+    from .game import BaseWorld
+    from .entities import Entity
+    from .helpers import Pointlike
+
+__all__ = ['Decks']
+
+
+class Decks:
+    """
+    A stack of decks, each its own world, generated the first time something
+    needs it and kept in memory only while it's in use.
+
+    At most `max_resident` decks stay loaded, not counting pinned ones (eg.
+    the player's). Past that, the least recently used deck gets saved to
+    `directory` and dropped; next time it's needed it's loaded back, with
+    its map memory-mapped, instead of generated again.
+
+    Without a `directory`, the decks go in a temporary one, deleted by
+    `close` or when the program exits.
+    """
+    __slots__ = ['directory', 'count', 'generate', 'world_class',
+                 'max_resident', 'pinned', '_resident', '_savers',
+                 '_on_disk', '_temporary']
+
+    def __init__(self,
+                 directory: Optional[Union[str, Path]],
+                 count: int,
+                 generate: Callable[[int], BaseWorld],
+                 world_class: Type[BaseWorld],
+                 max_resident: int = 3):
+        """
+        :param directory: Where to keep evicted decks, None for a temporary
+            directory
+        :param count: How many decks there are
+        :param generate: Function generating a deck from its index
+        :param world_class: Class of the decks' worlds, to load them with
+        :param max_resident: How many unpinned decks to keep in memory
+        """
+        self._temporary: Optional[TemporaryDirectory] = None
+        if directory is None:
+            self._temporary = TemporaryDirectory(prefix='sdtrl-decks-')
+            directory = self._temporary.name
+        self.directory: Path = Path(directory)
+        self.count: int = count
+        self.generate: Callable[[int], BaseWorld] = generate
+        self.world_class: Type[BaseWorld] = world_class
+        self.max_resident: int = max_resident
+        self.pinned: Set[int] = set()
+        # Loaded decks, least recently used first
+        self._resident: OrderedDict[int, BaseWorld] = OrderedDict()
+        self._savers: Dict[int, Autosaver] = {}
+        self._on_disk: Set[int] = set()
+
+    def _path(self, index: int) -> Path:
+        return self.directory / f'deck_{index}'
+
+    def __getitem__(self, index: int) -> BaseWorld:
+        """
+        Get a deck, loading or generating it if needed.
+        """
+        deck = self._load(index)
+        self._evict(keep={index})
+        return deck
+
+    def _load(self, index: int) -> BaseWorld:
+        if not 0 <= index < self.count:
+            raise IndexError(f"No deck {index}!")
+        deck = self._resident.get(index)
+        if deck is not None:
+            self._resident.move_to_end(index)
+            return deck
+        if index in self._on_disk:
+            deck, _ = load_world(self._path(index), self.world_class)
+            self._savers[index].loaded(deck)
+        else:
+            deck = self.generate(index)
+        deck.deck = index
+        for entity in deck.entities:
+            entity.deck = index
+        self._resident[index] = deck
+        return deck
+
+    def prefetch(self, around: Iterable[int], radius: int = 1
+                 ) -> List[BaseWorld]:
+        """
+        Load the decks within `radius` of the given ones, eg. of the decks
+        the player and the NPCs are on.
+
+        If that's more unpinned decks than `max_resident`, only the ones
+        nearest to the given decks get loaded.
+        :return: The decks, in order
+        """
+        around = set(around)
+        distances: Dict[int, int] = {}
+        for center in around:
+            for index in range(max(center - radius, 0),
+                               min(center + radius + 1, self.count)):
+                distance = abs(index - center)
+                if distances.get(index, distance) >= distance:
+                    distances[index] = distance
+        unpinned = sorted(
+            (index for index in distances if index not in self.pinned),
+            key=lambda index: (distances[index], index)
+        )
+        wanted = sorted(set(unpinned[:self.max_resident])
+                        | (self.pinned & set(distances)))
+        decks = [self._load(index) for index in wanted]
+        self._evict(keep=set(wanted))
+        return decks
+
+    def move(self, entity: Entity, index: int,
+             location: Pointlike = None) -> BaseWorld:
+        """
+        Move an entity from the deck it's on to another one, loading that
+        if needed.
+        :param location: Where on the new deck to put it - defaults to the
+            same place as on the old one
+        :return: The new deck
+        """
+        old = self._resident.get(entity.deck)
+        if old is not None and entity in old.entities:
+            old.remove_entity(entity)
+        deck = self[index]
+        if location is not None:
+            entity.location = location
+        deck.add_entity(entity)
+        return deck
+
+    def pin(self, index: int):
+        """
+        Never evict a deck, eg. while the player's on it.
+        """
+        self[index]
+        self.pinned.add(index)
+
+    def unpin(self, index: int):
+        self.pinned.discard(index)
+        self._evict()
+
+    def _evict(self, keep: Set[int] = frozenset()):
+        """
+        Evict the least recently used decks, until at most `max_resident`
+        unpinned ones are left - but never the ones in `keep`, which count
+        towards the limit all the same.
+        """
+        evictable = [index for index in self._resident
+                     if index not in self.pinned and index not in keep]
+        excess = len(evictable) + len(keep - self.pinned) - self.max_resident
+        for index in evictable[:max(excess, 0)]:
+            self.evict(index)
+
+    def evict(self, index: int):
+        """
+        Save a deck and drop it from memory.
+        """
+        self._save(index, self._resident.pop(index))
+
+    def save(self):
+        """
+        Save every loaded deck, keeping them loaded.
+        """
+        for index, deck in self._resident.items():
+            self._save(index, deck)
+
+    def _save(self, index: int, deck: BaseWorld):
+        saver = self._savers.get(index)
+        if saver is None:
+            saver = self._savers[index] = Autosaver(self._path(index))
+        saver.save(deck)
+        self._on_disk.add(index)
+
+    def close(self):
+        """
+        Delete the temporary directory the decks were kept in, if any.
+        Evicted decks are gone after this; loaded ones stay usable.
+        """
+        if self._temporary is not None:
+            self._temporary.cleanup()
+            self._temporary = None
+            self._on_disk.clear()
+            self._savers.clear()
+
+    def is_loaded(self, index: int) -> bool:
+        return index in self._resident
+
+    @property
+    def loaded(self) -> List[int]:
+        return list(self._resident)
+
+    @property
+    def worlds(self) -> List[BaseWorld]:
+        """
+        The loaded decks, without counting as using them.
+        """
+        return list(self._resident.values())
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,146 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import numpy as np
+
+__all__ = ['DirtyRegion', 'FrameDiff']
+
+
+Rect = Tuple[int, int, int, int]
+
+
+class FrameDiff:
+    """
+    The set of cells that changed between two frames, in a rectangle of the
+    map.
+    """
+    __slots__ = ['mask', 'origin']
+
+    def __init__(self, mask: np.ndarray, origin: Tuple[int, int] = (0, 0)):
+        # Boolean array, indexed [x, y]
+        self.mask: np.ndarray = mask
+        # Map coordinates of the mask's upper left corner
+        self.origin: Tuple[int, int] = origin
+
+    @property
+    def cells(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map coordinates of the changed cells, as a tuple of x and y arrays.
+        """
+        xs, ys = np.nonzero(self.mask)
+        return xs + self.origin[0], ys + self.origin[1]
+
+    @property
+    def bounds(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        The smallest (x, y, width, height) rectangle holding all the changed
+        cells, or None if nothing changed.
+        """
+        columns = np.flatnonzero(self.mask.any(axis=1))
+        if not len(columns):
+            return None
+        rows = np.flatnonzero(self.mask.any(axis=0))
+        return (int(columns[0]) + self.origin[0],
+                int(rows[0]) + self.origin[1],
+                int(columns[-1] - columns[0] + 1),
+                int(rows[-1] - rows[0] + 1))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.mask))
+
+    def __bool__(self) -> bool:
+        return bool(self.mask.any())
+
+
+class DirtyRegion:
+    """
+    Keeps track of the cells of a world that changed since the last time the
+    screen was drawn - tiles written to, cells entities moved from or to, and
+    cells that went in or out of view.
+
+    Starts out with everything dirty, so that the first frame gets drawn
+    whole.
+
+    Everything that reads it back takes an optional (x, y, width, height)
+    rectangle, to only look at the part of a big map that's on the screen -
+    changes outside of it are kept for later.
+    """
+    __slots__ = ['width', 'height', 'mask', '_last_visible']
+
+    def __init__(self, width: int, height: int):
+        self.width: int = width
+        self.height: int = height
+        self.mask: np.ndarray = np.ones((width, height), dtype=bool)
+        self._last_visible: np.ndarray = None
+
+    def mark(self, key):
+        """
+        Mark cells as dirty. Takes anything that indexes an [x, y] array -
+        coordinates, slices or a boolean mask.
+        """
+        self.mask[key] = True
+
+    def mark_cell(self, x: int, y: int):
+        # Entities can wander off the map, so this one checks the bounds.
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.mask[x, y] = True
+
+    def mark_all(self):
+        self.mask[...] = True
+
+    def update_visibility(self, visible: np.ndarray, rect: Rect = None):
+        """
+        Mark the cells whose visibility changed since the last call.
+        """
+        if self._last_visible is None:
+            self.mark_all()
+        elif visible is not self._last_visible:
+            window = _window(rect)
+            self.mask[window] |= visible[window] != self._last_visible[window]
+        self._last_visible = visible
+
+    def peek(self, rect: Rect = None) -> FrameDiff:
+        """
+        Get the cells changed since the last flush, without resetting them.
+        """
+        return FrameDiff(self.mask[_window(rect)].copy(), _origin(rect))
+
+    def take(self, rect: Rect = None) -> FrameDiff:
+        """
+        Get the cells changed since the last flush and start over.
+        """
+        if rect is None:
+            diff = FrameDiff(self.mask)
+            self.mask = np.zeros((self.width, self.height), dtype=bool)
+            return diff
+        window = self.mask[_window(rect)]
+        diff = FrameDiff(window.copy(), _origin(rect))
+        window[...] = False
+        return diff
+
+
+def _window(rect: Optional[Rect]) -> Tuple[slice, slice]:
+    if rect is None:
+        return slice(None), slice(None)
+    x, y, width, height = rect
+    return slice(x, x + width), slice(y, y + height)
+
+
+def _origin(rect: Optional[Rect]) -> Tuple[int, int]:
+    return (0, 0) if rect is None else (rect[0], rect[1])
@@ -16,16 +16,20 @@
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 from abc import ABC
-from typing import TYPE_CHECKING, Collection
-from .helpers import Point
+from typing import TYPE_CHECKING, Collection, Optional
+from .helpers import MutablePoint
 if TYPE_CHECKING:
     import tcod
     from .helpers import Pointlike
+    from .spatial import SpatialIndex
+    from .game import BaseWorld
 
 
 class Entity(ABC):
     __slots__ = [
-        'location',
+        '_location',
+        'index',
+        'deck',
 
         'character',
         'color',
@@ -52,7 +56,13 @@ class Entity(ABC):
                  # Visuals
                  character: int = None,
                  color: tcod.Color = None):
-        self.location: Point = Point(location[0], location[1])
+        # The spatial index this entity is in, if any - set by the index.
+        self.index: SpatialIndex = None
+        # Index of the deck the entity is on - set by the world.
+        self.deck: int = 0
+        self._location: MutablePoint = MutablePoint(
+            location[0], location[1], on_change=self._moved
+        )
 
         self.name: str = name
         self.description: str = description
@@ -66,4 +76,50 @@ class Entity(ABC):
         self.character: int = character
         self.color: tcod.Color = color
 
+    @property
+    def location(self) -> MutablePoint:
+        """
+        The entity's position. Moving the entity, whether by assigning to
+        `location` or changing it in place, keeps the spatial index the
+        entity is in up to date.
+        """
+        return self._location
 
+    @location.setter
+    def location(self, location: Pointlike):
+        self._location.set(location[0], location[1])
+
+    def act(self, world: BaseWorld) -> Optional[float]:
+        """
+        Take a turn. Gets called by the world's scheduler for entities that
+        `act`.
+        :return: How long until this entity acts again, or None to stop
+            acting
+        """
+        return None
+
+    def __getstate__(self):
+        # The spatial index and the location's callback belong to the world
+        # the entity is in, not to the entity - leave them out.
+        state = {
+            slot: getattr(self, slot) for slot in Entity.__slots__
+            if slot not in ('index', '_location') and hasattr(self, slot)
+        }
+        state['location'] = tuple(self._location)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        x, y = state.pop('location')
+        self.index = None
+        self._location = MutablePoint(x, y, on_change=self._moved)
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _moved(self):
+        if self.index is not None:
+            self.index.update(self)
+
+    def move(self, dx: int, dy: int):
+        self.location = (self._location[0] + dx, self._location[1] + dy)
@@ -0,0 +1,115 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Tuple
+
+import numpy as np
+import tcod
+import tcod.map
+
+from .profiling import PROFILER
+
+if TYPE_CHECKING:
+    from .helpers import Map, Pointlike
+
+__all__ = ['FieldOfView']
+
+
+class FieldOfView:
+    """
+    Field of view on a Map, computed by libtcod from the map's
+    `blocks_sight` array.
+
+    Results are cached per viewer position, and thrown away whenever the map
+    changes, so asking about the same viewer again is just an array lookup.
+    """
+    __slots__ = ['map', 'radius', 'light_walls', 'algorithm', 'cache_size',
+                 '_tcod_map', '_version', '_cache']
+
+    def __init__(self,
+                 map_: Map,
+                 radius: int = 0,
+                 light_walls: bool = True,
+                 algorithm: int = tcod.FOV_RESTRICTIVE,
+                 cache_size: int = 64):
+        """
+        :param map_: The map to compute FOV on
+        :param radius: Maximum view distance, 0 for unlimited
+        :param light_walls: Whether the walls around visible tiles are visible
+        :param algorithm: One of the tcod.FOV_* constants
+        :param cache_size: How many viewer positions to remember
+        """
+        self.map: Map = map_
+        self.radius: int = radius
+        self.light_walls: bool = light_walls
+        self.algorithm: int = algorithm
+        self.cache_size: int = cache_size
+        self._tcod_map: tcod.map.Map = None
+        self._version: int = None
+        self._cache: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+
+    def _sync(self):
+        """
+        Rebuild the transparency map if the map changed since the last time.
+        """
+        if self._version == self.map.version:
+            return
+        if (self._tcod_map is None
+                or self._tcod_map.width != self.map.width
+                or self._tcod_map.height != self.map.height):
+            self._tcod_map = tcod.map.Map(self.map.width, self.map.height,
+                                          order='F')
+        self._tcod_map.transparent[...] = ~self.map.blocks_sight
+        self._cache.clear()
+        self._version = self.map.version
+
+    def compute(self, from_: Pointlike) -> np.ndarray:
+        """
+        Get the read-only boolean mask, indexed [x, y], of tiles visible from
+        a given point.
+        """
+        self._sync()
+        key = (from_[0], from_[1])
+        mask = self._cache.get(key)
+        if mask is not None:
+            self._cache.move_to_end(key)
+            return mask
+        if 0 <= key[0] < self.map.width and 0 <= key[1] < self.map.height:
+            with PROFILER.span('fov'):
+                self._tcod_map.compute_fov(key[0], key[1], self.radius,
+                                           self.light_walls, self.algorithm)
+                mask = self._tcod_map.fov.copy()
+        else:
+            mask = np.zeros((self.map.width, self.map.height), dtype=bool)
+        mask.setflags(write=False)
+        self._cache[key] = mask
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return mask
+
+    def is_visible(self, from_: Pointlike, to: Pointlike) -> bool:
+        if not (0 <= to[0] < self.map.width and 0 <= to[1] < self.map.height):
+            return False
+        return bool(self.compute(from_)[to[0], to[1]])
+
+    def invalidate(self):
+        """
+        Drop all cached results.
+        """
+        self._cache.clear()
+        self._version = None
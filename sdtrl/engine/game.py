@@ -16,15 +16,25 @@
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import List, Iterable, Union, TYPE_CHECKING, Tuple, Type
+from typing import List, Iterable, Union, TYPE_CHECKING, Tuple, Type, \
+    Optional, Set
 
+import numpy as np
 import tcod
 from .helpers import CellContents, Map
+from .spatial import SpatialIndex
+from .scheduler import Scheduler
+from .fov import FieldOfView
+from .pathfinding import Pathfinder
+from .perception import Perception
+from .dirty import DirtyRegion, FrameDiff
+from .profiling import PROFILER
 
 from .ui import UI
 
 if TYPE_CHECKING:
     from .helpers import Pointlike
+    from .decks import Decks
     from .entities import Entity
     from .tiles import Tile
 
@@ -32,9 +42,55 @@ __all__ = ['Map', 'BaseWorld', 'BaseGame']
 
 
 class BaseWorld(ABC):
+    # How far entities can be seen from, in cells. 0 means no limit.
+    VIEW_RADIUS: int = 0
+
     def __init__(self, map_width, map_height):
-        self.map: Map[List[Tile]] = Map(map_width, map_height)
+        self.map: Map = Map(map_width, map_height)
         self.entities: List[Entity] = []
+        # Shared by the map and the entity index
+        self.dirty: DirtyRegion = self.map.dirty
+        self.entity_index: SpatialIndex = SpatialIndex(dirty=self.dirty)
+        self.fov: FieldOfView = FieldOfView(self.map, radius=self.VIEW_RADIUS)
+        # Which deck of the ship this is, if the game has several
+        self.deck: int = 0
+        self.scheduler: Scheduler = Scheduler()
+        self.pathfinder: Pathfinder = Pathfinder(self.map)
+        self.perception: Perception = Perception(self)
+
+    def add_entity(self, entity: Entity):
+        entity.deck = self.deck
+        self.entities.append(entity)
+        self.entity_index.add(entity)
+        if entity.acts:
+            self.scheduler.schedule(entity)
+
+    def remove_entity(self, entity: Entity):
+        self.entities.remove(entity)
+        self.entity_index.remove(entity)
+        self.scheduler.discard(entity)
+
+    def save_state(self) -> dict:
+        """
+        Get whatever a subclass keeps on top of the map and entities, to be
+        saved. Has to be picklable.
+        """
+        return {}
+
+    def load_state(self, state: dict):
+        """
+        Restore what `save_state` returned.
+        """
+        pass
+
+    def entities_in_view_range(self, from_: Pointlike) -> Iterable[Entity]:
+        """
+        Get entities within VIEW_RADIUS of a given point, whether or not
+        they're actually visible from it.
+        """
+        if self.VIEW_RADIUS:
+            return self.entity_index.in_radius(from_, self.VIEW_RADIUS)
+        return iter(self.entity_index)
 
     @abstractmethod
     def get_visible_entities(self, from_: Pointlike) -> Iterable[Entity]:
@@ -51,6 +107,21 @@ class BaseWorld(ABC):
         """
         ...
 
+    def visibility_mask(self, from_: Pointlike) -> np.ndarray:
+        """
+        Get a boolean array, indexed [x, y], of the tiles visible from a given
+        tile.
+
+        The default implementation asks `is_visible` about every single tile,
+        so you'll want to override it with something faster.
+        :param from_: The starting point
+        """
+        mask = np.zeros((self.map.width, self.map.height), dtype=bool)
+        for x in range(self.map.width):
+            for y in range(self.map.height):
+                mask[x, y] = self.is_visible(from_, (x, y))
+        return mask
+
     def __matmul__(
             self,
             coords: Tuple[int, int]
@@ -62,7 +133,7 @@ class BaseWorld(ABC):
         """
         return CellContents(
             tile=self.map @ coords,
-            entities=[ent for ent in self.entities if ent.location == coords]
+            entities=self.entity_index.at(coords)
         )
 
 
@@ -71,24 +142,96 @@ class BaseGame(ABC):
     Base main class for the game. Your game should inherit from this.
 
     Remember to set the TITLE.
+
+    Pass `headless=True` to run without a window, eg. for benchmarks - the
+    UI then draws into an offscreen console, and gets driven with `UI.step`
+    instead of `UI.run`.
     """
-    __slots__ = ['console', 'world', 'ui', 'player']
+    __slots__ = ['console', 'world', 'ui', 'player', 'headless', 'decks',
+                 'followed']
     UI_CLASS: Type[UI] = UI
     WORLD_CLASS: Type[BaseWorld] = None
     WORLD_WIDTH: int = 80
     WORLD_HEIGHT: int = 50
+    # Simulation ticks per second, while the game is animating
+    TICK_RATE: float = 10
+    # How much game time passes in a tick, in the units of `Entity.act`
+    TICK_DURATION: float = 1.0
+    # How many decks around a followed entity's one to keep loaded
+    DECK_PREFETCH_RADIUS: int = 1
 
-    def __init__(self):
+    def __init__(self, headless: bool = False):
+        self.headless: bool = headless
         self.world: BaseWorld = None
         self.player: Entity = None
+        # All the decks, if `create_decks` gives the game several
+        self.decks: Optional[Decks] = None
+        # Entities whose surroundings are kept loaded and simulated - the
+        # player, and whoever else the game cares about
+        self.followed: Set[Entity] = set()
         self.ui: UI = self.UI_CLASS(self)
         self.console: tcod.tcod.console.Console = self.ui.init_root()
 
     def start_game(self):
-        self.world = self.WORLD_CLASS(
-            self.WORLD_WIDTH, self.WORLD_HEIGHT
-        )
+        self.end_game()
+        self.followed = set()
+        self.decks = self.create_decks()
+        if self.decks is None:
+            self.world = self.WORLD_CLASS(
+                self.WORLD_WIDTH, self.WORLD_HEIGHT
+            )
+        else:
+            self.world = self.decks[0]
         self.init_world()
+        if self.player is not None:
+            self.followed.add(self.player)
+        if self.decks is not None:
+            # The player's deck is the one on the screen
+            self.decks.pin(self.world.deck)
+            self.prefetch_decks()
+
+    def end_game(self):
+        """
+        Clean up after the game, eg. once the main loop is over.
+        """
+        if self.decks is not None:
+            self.decks.close()
+            self.decks = None
+
+    def create_decks(self) -> Optional[Decks]:
+        """
+        Create the decks of a multi-deck world, or return None for a single
+        WORLD_CLASS world. The game starts on deck 0.
+        """
+        return None
+
+    def move_to_deck(self, entity: Entity, index: int,
+                     location: Pointlike = None):
+        """
+        Move an entity to another deck. If it's the player, their new deck
+        gets pinned and shown instead of the old one.
+        :param location: Where on the new deck to put it - defaults to the
+            same place as on the old one
+        """
+        self.decks.move(entity, index, location)
+        if entity is self.player:
+            self.decks.unpin(self.world.deck)
+            self.decks.pin(index)
+            self.world = self.decks[index]
+            self.ui.world_changed()
+
+    def prefetch_decks(self):
+        """
+        Load the decks around the ones followed entities are on, so that
+        they're ready before anyone gets there.
+        """
+        occupied = {entity.deck for entity in self.followed}
+        # Room for everyone's surroundings, however far apart they are
+        self.decks.max_resident = max(
+            self.decks.max_resident,
+            len(occupied) * (2 * self.DECK_PREFETCH_RADIUS + 1)
+        )
+        self.decks.prefetch(occupied, self.DECK_PREFETCH_RADIUS)
 
     @abstractmethod
     def init_world(self):
@@ -98,7 +241,37 @@ class BaseGame(ABC):
         ...
 
     def tick(self, key: Union[tcod.Key, None] = None):
-        self.handle_keypress(key)
+        """
+        Advance the simulation by one step.
+
+        Gets called once for every keypress, and TICK_RATE times a second
+        without a key while `is_animating` is true.
+
+        Every tick moves game time forward by TICK_DURATION, and lets the
+        entities that came due act - on every loaded deck, if there are
+        several.
+        """
+        if key is not None:
+            with PROFILER.span('input'):
+                self.handle_keypress(key)
+        if self.decks is not None:
+            with PROFILER.span('decks'):
+                self.prefetch_decks()
+            worlds = self.decks.worlds
+        elif self.world is not None:
+            worlds = [self.world]
+        else:
+            return
+        with PROFILER.span('actors'):
+            for world in worlds:
+                world.scheduler.advance(self.TICK_DURATION, world)
+
+    def is_animating(self) -> bool:
+        """
+        Whether the game needs ticking even when there's no input. If not,
+        the main loop sleeps until the next keypress.
+        """
+        return False
 
     def get_visible_entities(self) -> Iterable[Entity]:
         """
@@ -108,6 +281,29 @@ class BaseGame(ABC):
             self.player.location
         )
 
+    def frame_diff(self, rect: Tuple[int, int, int, int] = None
+                   ) -> FrameDiff:
+        """
+        Get the cells that changed since the screen was last drawn - tiles
+        that were written to, cells entities moved from or to, and cells that
+        went in or out of view.
+
+        Entities that change their looks without moving should mark their
+        cell themselves, with `world.dirty.mark_cell(x, y)`.
+        :param rect: (x, y, width, height) rectangle of the map to look at,
+            eg. the part that's on the screen - defaults to the whole map
+        """
+        self.world.dirty.update_visibility(self.visibility_mask(), rect)
+        return self.world.dirty.peek(rect)
+
+    def take_frame_diff(self, rect: Tuple[int, int, int, int] = None
+                        ) -> FrameDiff:
+        """
+        Like frame_diff, but also starts tracking changes over.
+        """
+        self.world.dirty.update_visibility(self.visibility_mask(), rect)
+        return self.world.dirty.take(rect)
+
     def is_visible(self, what: Union[Pointlike, Entity]) -> bool:
         """
         Check if an entity or a tile is visible on the screen.
@@ -115,6 +311,13 @@ class BaseGame(ABC):
         """
         return self.world.is_visible(self.player.location, what)
 
+    def visibility_mask(self) -> np.ndarray:
+        """
+        Get a boolean array, indexed [x, y], of the tiles visible on the
+        screen.
+        """
+        return self.world.visibility_mask(self.player.location)
+
     @abstractmethod
     def create_player_character(self) -> Entity:
         ...
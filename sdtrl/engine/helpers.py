@@ -16,26 +16,33 @@
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 
 
-# We pretty much reimplement namedtuple here to have the benefits of
-# __slots__ but also define methods, have a Point be mutable and let it be
-# unpacked.
+# Points are plain namedtuples, so they're hashable and cheap to make.
+# MutablePoint is a small __slots__ class that quacks like one, for entity
+# locations that change in place.
 from __future__ import annotations
 from typing import NamedTuple, TYPE_CHECKING, List, Tuple, Optional, Union, \
-    Sequence, Dict
+    Sequence, Dict, Callable, Iterable, Iterator
 from dataclasses import dataclass
 from enum import Enum
+from itertools import product
 from textwrap import wrap
 
+import numpy as np
 from tcod import Color, image_load
 
+from .dirty import DirtyRegion
+from .tiles import TileRegistry, TILES, TILE_ID_DTYPE
+
 if TYPE_CHECKING:
     from tcod.image import Image
     from pathlib import Path
     from .tiles import Tile
     from .entities import Entity
 
-__all__ = ['Color', 'Point', 'CellContents', 'Map', 'MemorizedCell',
-           'Pointlike', 'GameState', 'SplashScreen']
+__all__ = ['Color', 'Point', 'MutablePoint', 'points_to_array',
+           'array_to_points', 'CellContents', 'Map', 'SparseOverlay',
+           'MemorizedCell', 'Pointlike', 'GameState', 'SplashScreen',
+           'TILE_ID_DTYPE']
 
 
 @dataclass
@@ -60,24 +67,25 @@ class SplashScreen:
         self.title = title
         self.logo = image_load(logo.as_posix())
         self.credits = credits
-        self._centered_title: str = None
-        self._centered_credits: str = None
+        # Centered text, per width
+        self._centered_title: Dict[int, str] = {}
+        self._centered_credits: Dict[int, str] = {}
         self.title_color = title_color
         self.credits_color = credits_color
 
     def get_centered_credits(self, width: int) -> str:
-        if self._centered_credits is None:
-            self._centered_credits = "\n".join(
+        if width not in self._centered_credits:
+            self._centered_credits[width] = "\n".join(
                 line.center(width) for line in self.credits.split('\n')
             )
-        return self._centered_credits
+        return self._centered_credits[width]
 
     def get_centered_title(self, width: int) -> str:
-        if self._centered_title is None:
-            self._centered_title = "\n".join(
+        if width not in self._centered_title:
+            self._centered_title[width] = "\n".join(
                 line.center(width) for line in wrap(self.title, width)
             )
-        return self._centered_title
+        return self._centered_title[width]
 
     # def get_centered_title_art(self, width: int) -> str:
     #     if self._centered_title_art is None:
@@ -94,93 +102,272 @@ class GameState(Enum):
     GAME = 1
 
 
-class Map(list):
+class SparseOverlay(dict):
+    """
+    Per-cell state that only some cells of a map have, eg. bloodstains or
+    which room a cell belongs to. Maps (x, y) to a value.
+    """
+    __slots__ = []
+
+    def fill(self, x: int, y: int, width: int, height: int, value):
+        """
+        Set the value for every cell in a rectangle.
+        """
+        self.update(dict.fromkeys(
+            product(range(x, x + width), range(y, y + height)), value
+        ))
+
+    def clear_rect(self, x: int, y: int, width: int, height: int):
+        for cx in range(x, x + width):
+            for cy in range(y, y + height):
+                self.pop((cx, cy), None)
+
+
+class Map:
     """
     A 2d array of tiles.
+
+    Cells don't hold `Tile` objects, only the id of their kind of tile from
+    a TileRegistry, in `ids`, a NumPy array indexed `[x, y]` (the same layout
+    as an `order='F'` console). Per-cell attributes can then be read for the
+    whole map at once as arrays - `walkable`, `blocks_sight`, `character`,
+    `fg` and `bg`. Per-cell state that isn't part of the kind of tile lives
+    in `overlays`.
+
+    Id 0 is reserved for empty cells, so `map @ (x, y)` returns None there.
+
+    Tiles on the map are shared between all the cells of the same kind - don't
+    modify a tile you got from the map, put a modified copy back instead.
     """
     __slots__ = [
-        'width', 'height'
+        'width', 'height',
+        'ids', 'tiles', 'overlays', 'version', 'dirty',
+        '_cache'
     ]
 
     def __init__(self,
                  width: int,
-                 height: int):
-        map_ = [] * height
-        for y in range(height):
-            map_.append([None] * width)
-        super().__init__(map_)
-        self.width = width
-        self.height = height
-
-    def __matmul__(self, coords: Tuple[int, int]) -> Tile:
+                 height: int,
+                 tiles: TileRegistry = TILES):
+        self.width: int = width
+        self.height: int = height
+        self.ids: np.ndarray = np.zeros((width, height), dtype=TILE_ID_DTYPE)
+        self.tiles: TileRegistry = tiles
+        self.overlays: Dict[str, SparseOverlay] = {}
+        # Bumped on every write, so that anything derived from the map (FOV,
+        # paths, ...) knows when to recompute.
+        self.version: int = 0
+        # Cells written to since the screen was last drawn
+        self.dirty: DirtyRegion = DirtyRegion(width, height)
+        self._cache: Dict[str, Tuple[int, int, np.ndarray]] = {}
+
+    @property
+    def palette(self) -> List[Optional[Tile]]:
+        """
+        All the kinds of tiles cells can refer to, indexed by id.
+        """
+        return self.tiles.tiles
+
+    def overlay(self, name: str) -> SparseOverlay:
+        """
+        Get an overlay by name, creating it if needed.
+        """
+        overlay = self.overlays.get(name)
+        if overlay is None:
+            overlay = self.overlays[name] = SparseOverlay()
+        return overlay
+
+    def _lookup(self, attribute: str) -> np.ndarray:
+        cached = self._cache.get(attribute)
+        if (cached is not None and cached[0] == self.version
+                and cached[1] == len(self.tiles)):
+            return cached[2]
+        array = self.tiles.luts[attribute][self.ids]
+        array.setflags(write=False)
+        self._cache[attribute] = (self.version, len(self.tiles), array)
+        return array
+
+    @property
+    def walkable(self) -> np.ndarray:
+        return self._lookup('walkable')
+
+    @property
+    def blocks_sight(self) -> np.ndarray:
+        return self._lookup('blocks_sight')
+
+    @property
+    def character(self) -> np.ndarray:
+        return self._lookup('character')
+
+    @property
+    def fg(self) -> np.ndarray:
+        return self._lookup('fg')
+
+    @property
+    def bg(self) -> np.ndarray:
+        return self._lookup('bg')
+
+    def __getitem__(self, coords: Tuple[int, int]) -> Optional[Tile]:
+        return self.tiles[self.ids[coords[0], coords[1]]]
+
+    def __setitem__(self, key, tile: Union[Tile, int, np.ndarray, None]):
+        """
+        Lets us do `map[x, y] = tile`, with either a Tile or its id. Slices
+        work too, so whole rows, columns and rectangles can be filled at once,
+        eg. `map[x0:x1, y0:y1] = tile`, or copied from an array of ids.
+        """
+        self.ids[key] = self.tiles.id_of(tile)
+        self.dirty.mark(key)
+        self.version += 1
+
+    def load_ids(self, ids: np.ndarray):
+        """
+        Replace all the map's tile ids at once, eg. with a memory-mapped
+        array from a save.
+        """
+        if ids.shape != self.ids.shape:
+            raise ValueError("Tile ids don't fit this map!")
+        self.ids = ids
+        self.dirty.mark_all()
+        self.version += 1
+
+    def __matmul__(self, coords: Tuple[int, int]) -> Optional[Tile]:
         """
         Lets us do `map @ (x, y)` for prettiness
         """
-        return self[coords[1]][coords[0]]
+        return self.tiles[self.ids[coords[0], coords[1]]]
 
     def __repr__(self):
+        chars = np.where(self.ids == 0, ord('_'), self.character)
+        chars[(self.ids != 0) & (chars == 0)] = ord(' ')
         return "\n".join(
-            "".join(
-                (chr(tile.character) if tile.character else ' ')
-                if tile else '_'
-                for tile in row)
-            for row in self
+            "".join(chr(ch) for ch in chars[:, y])
+            for y in range(self.height)
         )
 
     def __str__(self):
         return self.__repr__()
 
 
-class Point(list):
-    def __init__(self, x, y):
-        super().__init__([x, y])
+class Point(NamedTuple):
+    """
+    An immutable, hashable pair of coordinates.
+    """
+    x: int
+    y: int
+
+    def __add__(self, other: Pointlike) -> Point:
+        return Point(self[0] + other[0], self[1] + other[1])
+
+    def __sub__(self, other: Pointlike) -> Point:
+        return Point(self[0] - other[0], self[1] - other[1])
+
+    def __neg__(self) -> Point:
+        return Point(-self[0], -self[1])
+
+
+class MutablePoint:
+    """
+    A pair of coordinates that can change in place, eg. an entity's location.
+
+    Calls `on_change`, if given, whenever the coordinates change. Compares
+    equal to Points and tuples with the same coordinates, but isn't hashable
+    - use `freeze` to get a Point.
+    """
+    __slots__ = ['_x', '_y', 'on_change']
+    __hash__ = None
+
+    def __init__(self, x: int, y: int,
+                 on_change: Callable[[], None] = None):
+        self._x: int = x
+        self._y: int = y
+        self.on_change: Optional[Callable[[], None]] = on_change
 
     @property
     def x(self) -> int:
-        return self[0]
+        return self._x
 
     @x.setter
     def x(self, val: int):
-        self[0] = val
+        self.set(val, self._y)
 
     @property
     def y(self) -> int:
-        return self[1]
+        return self._y
 
     @y.setter
     def y(self, val: int):
-        self[1] = val
-
-    def __iadd__(self, other):
-        if len(other) != 2:
-            raise TypeError("Can't add f{other} to a Point!")
-        self[0] += other[0]
-        self[1] += other[1]
+        self.set(self._x, val)
+
+    def set(self, x: int, y: int):
+        if x == self._x and y == self._y:
+            return
+        self._x = x
+        self._y = y
+        if self.on_change is not None:
+            self.on_change()
+
+    def freeze(self) -> Point:
+        return Point(self._x, self._y)
+
+    def __getitem__(self, index: int) -> int:
+        if index == 0 or index == -2:
+            return self._x
+        if index == 1 or index == -1:
+            return self._y
+        raise IndexError("MutablePoint index out of range")
+
+    def __iter__(self) -> Iterator[int]:
+        yield self._x
+        yield self._y
+
+    def __len__(self) -> int:
+        return 2
+
+    def __iadd__(self, other: Pointlike) -> MutablePoint:
+        self.set(self._x + other[0], self._y + other[1])
         return self
 
-    def __add__(self, other):
-        if len(other) != 2:
-            raise TypeError("Can't add f{other} to a Point!")
-        return Point(self[0] + other[0], self[1] + other[1])
-
-    def __isub__(self, other):
-        if len(other) != 2:
-            raise TypeError("Can't subtract f{other} from a Point!")
-        self[0] += other[0]
-        self[1] += other[1]
+    def __isub__(self, other: Pointlike) -> MutablePoint:
+        self.set(self._x - other[0], self._y - other[1])
         return self
 
-    def __sub__(self, other):
-        if len(other) != 2:
-            raise TypeError("Can't subtract f{other} from a Point!")
-        return Point(self[0] + other[0], self[1] + other[1])
+    def __add__(self, other: Pointlike) -> Point:
+        return Point(self._x + other[0], self._y + other[1])
+
+    def __sub__(self, other: Pointlike) -> Point:
+        return Point(self._x - other[0], self._y - other[1])
 
     def __eq__(self, other):
-        return list(other) == list(self)
+        try:
+            return (len(other) == 2
+                    and self._x == other[0] and self._y == other[1])
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"MutablePoint(x={self._x}, y={self._y})"
+
+
+def points_to_array(points: Iterable[Pointlike]) -> np.ndarray:
+    """
+    Convert points to an (n, 2) integer array of coordinates.
+
+    `tuple(array.T)` gives (xs, ys), ready for indexing [x, y] arrays.
+    """
+    array = np.array([(p[0], p[1]) for p in points], dtype=np.intp)
+    return array.reshape(-1, 2)
+
+
+def array_to_points(array: np.ndarray) -> List[Point]:
+    """
+    Convert an (n, 2) array of coordinates to a list of Points.
+    """
+    return [Point(x, y) for x, y in array.tolist()]
 
 
 # Type alias for types compatible with Point, for ease of typing
-Pointlike = Union[Point, Tuple[int, int], Sequence[int]]
+Pointlike = Union[Point, MutablePoint, Tuple[int, int], Sequence[int]]
 
 
 class CellContents(NamedTuple):
@@ -0,0 +1,149 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from collections import deque
+from time import perf_counter, sleep
+from typing import Deque, Optional
+
+__all__ = ['FrameClock', 'LatencyTracker', 'RateCounter']
+
+
+class FrameClock:
+    """
+    Paces the main loop to a target frame rate, and keeps a separate
+    fixed-timestep clock for the simulation.
+
+    Time spent blocked waiting for input doesn't count towards simulation
+    ticks - call `resync` after waking up.
+    """
+    __slots__ = ['fps', 'tick_rate', 'max_ticks_per_frame',
+                 '_next_frame', '_last_time', '_accumulator']
+
+    def __init__(self, fps: float = 30,
+                 tick_rate: float = 10,
+                 max_ticks_per_frame: int = 5):
+        """
+        :param fps: Target frames per second
+        :param tick_rate: Simulation ticks per second
+        :param max_ticks_per_frame: Most ticks to run to catch up in one
+            frame, so that a slow frame can't snowball
+        """
+        self.fps: float = fps
+        self.tick_rate: float = tick_rate
+        self.max_ticks_per_frame: int = max_ticks_per_frame
+        self._next_frame: float = 0
+        self._last_time: float = 0
+        self._accumulator: float = 0
+        self.resync()
+
+    def resync(self):
+        """
+        Start counting time from now, dropping any time that passed since
+        the clock was last looked at.
+        """
+        now = perf_counter()
+        self._next_frame = now
+        self._last_time = now
+        self._accumulator = 0
+
+    def wait_for_next_frame(self):
+        """
+        Sleep until it's time to draw the next frame.
+        """
+        now = perf_counter()
+        if self._next_frame > now:
+            sleep(self._next_frame - now)
+            now = self._next_frame
+        # If we fell behind, this doesn't try to make up for missed frames.
+        self._next_frame = now + 1 / self.fps
+
+    def ticks_due(self) -> int:
+        """
+        Get how many fixed simulation steps are due since the last call.
+        """
+        now = perf_counter()
+        self._accumulator += now - self._last_time
+        self._last_time = now
+        step = 1 / self.tick_rate
+        ticks = int(self._accumulator // step)
+        if ticks > self.max_ticks_per_frame:
+            ticks = self.max_ticks_per_frame
+            self._accumulator = 0
+        else:
+            self._accumulator -= ticks * step
+        return ticks
+
+
+class LatencyTracker:
+    """
+    Measures the time between getting some input and having its result on
+    the screen, over the last `size` inputs.
+    """
+    __slots__ = ['samples', '_started']
+
+    def __init__(self, size: int = 120):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self._started: Optional[float] = None
+
+    def start(self):
+        self._started = perf_counter()
+
+    def stop(self):
+        if self._started is not None:
+            self.samples.append(perf_counter() - self._started)
+            self._started = None
+
+    @property
+    def last(self) -> Optional[float]:
+        return self.samples[-1] if self.samples else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    @property
+    def worst(self) -> Optional[float]:
+        return max(self.samples) if self.samples else None
+
+
+class RateCounter:
+    """
+    Counts how many times per second something happens, over the last
+    `size` occurrences.
+    """
+    __slots__ = ['total', '_times']
+
+    def __init__(self, size: int = 120):
+        self.total: int = 0
+        self._times: Deque[float] = deque(maxlen=size)
+
+    def count(self):
+        self.total += 1
+        self._times.append(perf_counter())
+
+    @property
+    def per_second(self) -> float:
+        if len(self._times) < 2:
+            return 0.0
+        elapsed = self._times[-1] - self._times[0]
+        if not elapsed:
+            return 0.0
+        return (len(self._times) - 1) / elapsed
+
+    def reset(self):
+        self.total = 0
+        self._times.clear()
@@ -0,0 +1,114 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional, Union, BinaryIO
+
+import numpy as np
+from tcod import Color
+
+from .helpers import MemorizedCell
+from .render import blank_frame
+from .tiles import TILES, TILE_ID_DTYPE
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from .tiles import TileRegistry
+
+__all__ = ['MemoryLayer']
+
+
+class MemoryLayer:
+    """
+    What the player remembers seeing, for drawing no-longer-visible cells.
+
+    Stored as arrays indexed [x, y]: `frame` holds the glyphs and the already
+    dimmed colors, ready to be copied into a frame, `tile_ids` the ids of the
+    remembered tiles (to get their names from), and `seen` whether a cell was
+    ever seen at all.
+    """
+    __slots__ = ['width', 'height', 'frame', 'tile_ids', 'seen', 'tiles',
+                 'fg_color', 'bg_color']
+
+    def __init__(self, width: int, height: int,
+                 fg_color: Color, bg_color: Color,
+                 tiles: TileRegistry = TILES):
+        """
+        :param fg_color: Foreground color of cells that were never seen
+        :param bg_color: Background color of cells that were never seen
+        :param tiles: The registry remembered tile ids refer to
+        """
+        self.width: int = width
+        self.height: int = height
+        self.fg_color: Color = fg_color
+        self.bg_color: Color = bg_color
+        self.tiles: TileRegistry = tiles
+        self.frame: np.ndarray = blank_frame(width, height, fg_color,
+                                             bg_color)
+        self.tile_ids: np.ndarray = np.zeros((width, height),
+                                             dtype=TILE_ID_DTYPE)
+        self.seen: np.ndarray = np.zeros((width, height), dtype=bool)
+
+    def memorize(self, where, tiles: np.ndarray, tile_ids: np.ndarray):
+        """
+        Remember cells, in one masked assignment.
+        :param where: Anything that indexes an [x, y] array - a boolean mask
+            (eg. a FOV mask), or a tuple of x and y coordinate arrays
+        :param tiles: Frame of the tiles in those cells, undimmed
+        :param tile_ids: Ids of the tiles in those cells
+        """
+        dimmed = tiles.copy()
+        dimmed['fg'] //= 2
+        dimmed['bg'] //= 2
+        self.frame[where] = dimmed
+        self.tile_ids[where] = tile_ids
+        self.seen[where] = True
+
+    def forget(self):
+        self.frame[...] = blank_frame(1, 1, self.fg_color, self.bg_color)[0, 0]
+        self.tile_ids[...] = 0
+        self.seen[...] = False
+
+    def __matmul__(self, coords) -> Optional[MemorizedCell]:
+        """
+        Lets us do `memory @ (x, y)`. Returns None for cells never seen.
+        """
+        x, y = coords[0], coords[1]
+        if not self.seen[x, y]:
+            return None
+        cell = self.frame[x, y]
+        tile = self.tiles[self.tile_ids[x, y]]
+        return MemorizedCell(
+            int(cell['ch']),
+            Color(*cell['fg'].tolist()),
+            Color(*cell['bg'].tolist()),
+            tile.name if tile else None
+        )
+
+    def save(self, file: Union[str, Path, BinaryIO]):
+        np.savez(file, frame=self.frame, tile_ids=self.tile_ids,
+                 seen=self.seen)
+
+    def load(self, file: Union[str, Path, BinaryIO]):
+        """
+        Replace what's remembered with a layer saved with `save`.
+        """
+        with np.load(file) as data:
+            if data['seen'].shape != self.seen.shape:
+                raise ValueError("Saved memory doesn't fit this map!")
+            self.frame[...] = data['frame']
+            self.tile_ids[...] = data['tile_ids']
+            self.seen[...] = data['seen']
@@ -0,0 +1,204 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Tuple, Iterable, Optional, List
+
+import numpy as np
+
+from .helpers import Point
+from .profiling import profiled
+
+if TYPE_CHECKING:
+    from .helpers import Map, Pointlike
+
+__all__ = ['DistanceField', 'Pathfinder', 'UNREACHABLE']
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+# Neighbours to step to, straight moves first so paths don't zig-zag
+NEIGHBOURS = ((0, -1), (1, 0), (0, 1), (-1, 0),
+              (1, -1), (1, 1), (-1, 1), (-1, -1))
+
+
+class DistanceField:
+    """
+    Distances, in moves, from every cell of a map to the nearest of a set of
+    goals - also known as a Dijkstra map or flow field. Any number of
+    entities heading to the same goals can walk down the same field.
+
+    Moves go to any of the eight neighbouring cells, and all cost the same.
+    """
+    __slots__ = ['goals', 'distances']
+    # Wavefronts up to this many cells wide get searched without numpy
+    NARROW_FRONTIER: int = 32
+
+    def __init__(self, goals: Tuple[Tuple[int, int], ...],
+                 distances: np.ndarray):
+        self.goals: Tuple[Tuple[int, int], ...] = goals
+        # Indexed [x, y], UNREACHABLE where there's no way to the goals
+        self.distances: np.ndarray = distances
+
+    @classmethod
+    @profiled('pathfinding')
+    def compute(cls, walkable: np.ndarray,
+                goals: Tuple[Tuple[int, int], ...]) -> DistanceField:
+        """
+        Breadth-first search of the walkable cells outwards from the goals,
+        so every cell gets looked at once. The goals themselves don't have
+        to be walkable.
+        """
+        width, height = walkable.shape
+        # Work on flat indices into a copy with a closed border, so
+        # neighbours never need bounds checks
+        stride = height + 2
+        unreached = np.zeros((width + 2, stride), dtype=bool)
+        unreached[1:-1, 1:-1] = walkable
+        distances = np.full(unreached.shape, UNREACHABLE, dtype=np.int32)
+        unreached_flat = unreached.ravel()
+        distances_flat = distances.ravel()
+        frontier = [(x + 1)*stride + y + 1 for x, y in goals
+                    if 0 <= x < width and 0 <= y < height]
+        unreached_flat[frontier] = False
+        distances_flat[frontier] = 0
+        offsets = tuple(dx*stride + dy for dx, dy in NEIGHBOURS)
+        offset_array = np.array(offsets, dtype=np.intp)
+        step = 0
+        while len(frontier):
+            step += 1
+            if isinstance(frontier, list):
+                # A narrow wavefront - corridors, mostly - is quicker to walk
+                # in plain Python than to push through numpy
+                grown = []
+                for cell in frontier:
+                    for offset in offsets:
+                        neighbour = cell + offset
+                        if unreached_flat[neighbour]:
+                            unreached_flat[neighbour] = False
+                            distances_flat[neighbour] = step
+                            grown.append(neighbour)
+                if len(grown) > cls.NARROW_FRONTIER:
+                    grown = np.array(grown, dtype=np.intp)
+            else:
+                grown = (frontier[:, np.newaxis] + offset_array).ravel()
+                grown = np.unique(grown[unreached_flat[grown]])
+                unreached_flat[grown] = False
+                distances_flat[grown] = step
+                if len(grown) <= cls.NARROW_FRONTIER:
+                    grown = grown.tolist()
+            frontier = grown
+        distances = distances[1:-1, 1:-1].copy()
+        distances.setflags(write=False)
+        return cls(goals, distances)
+
+    def distance(self, from_: Pointlike) -> int:
+        return int(self.distances[from_[0], from_[1]])
+
+    def step_from(self, from_: Pointlike) -> Optional[Point]:
+        """
+        Get the neighbouring cell one move closer to the goals, or None if
+        already at a goal or if there's no way there.
+        """
+        width, height = self.distances.shape
+        best = self.distances[from_[0], from_[1]]
+        if best == 0 or best == UNREACHABLE:
+            return None
+        step = None
+        for dx, dy in NEIGHBOURS:
+            x, y = from_[0] + dx, from_[1] + dy
+            if 0 <= x < width and 0 <= y < height \
+                    and self.distances[x, y] < best:
+                best = self.distances[x, y]
+                step = Point(x, y)
+        return step
+
+    def path_from(self, from_: Pointlike) -> List[Point]:
+        """
+        Get the whole way to the nearest goal, not including the start.
+        Empty if there's no way there.
+        """
+        path = []
+        step = self.step_from(from_)
+        while step is not None:
+            path.append(step)
+            step = self.step_from(step)
+        return path
+
+
+class Pathfinder:
+    """
+    Hands out distance fields on a Map, computed from its `walkable` array.
+
+    Fields are cached per set of goals, so entities heading to the same
+    place share one; they're thrown away only when the map changes in a way
+    that changes what's walkable.
+    """
+    __slots__ = ['map', 'cache_size', '_cache', '_version', '_walkable']
+
+    def __init__(self, map_: Map, cache_size: int = 32):
+        """
+        :param map_: The map to find paths on
+        :param cache_size: How many distance fields to remember
+        """
+        self.map: Map = map_
+        self.cache_size: int = cache_size
+        self._cache: OrderedDict[Tuple[Tuple[int, int], ...],
+                                 DistanceField] = OrderedDict()
+        self._version: int = None
+        self._walkable: np.ndarray = None
+
+    def _sync(self):
+        if self._version == self.map.version:
+            return
+        walkable = self.map.walkable
+        if (self._walkable is None
+                or not np.array_equal(walkable, self._walkable)):
+            self._cache.clear()
+            self._walkable = walkable
+        self._version = self.map.version
+
+    def field(self, goals: Iterable[Pointlike]) -> DistanceField:
+        """
+        Get the distance field towards a set of goals.
+        """
+        self._sync()
+        key = tuple(sorted({(goal[0], goal[1]) for goal in goals}))
+        field = self._cache.get(key)
+        if field is not None:
+            self._cache.move_to_end(key)
+            return field
+        field = DistanceField.compute(self._walkable, key)
+        self._cache[key] = field
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return field
+
+    def step(self, from_: Pointlike,
+             goals: Iterable[Pointlike]) -> Optional[Point]:
+        """
+        Get the next move towards the nearest of the goals, see
+        `DistanceField.step_from`.
+        """
+        return self.field(goals).step_from(from_)
+
+    def invalidate(self):
+        """
+        Drop all cached fields.
+        """
+        self._cache.clear()
+        self._version = None
+        self._walkable = None
@@ -0,0 +1,172 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+What everyone can see.
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+from typing import TYPE_CHECKING, Dict, Set, Tuple, Iterable, List
+
+import numpy as np
+import tcod
+import tcod.map
+
+from .profiling import profiled
+
+if TYPE_CHECKING:
+    from .game import BaseWorld
+    from .entities import Entity
+
+__all__ = ['Perception']
+
+
+class Perception:
+    """
+    Field of view for many viewers at once, eg. for every NPC each turn.
+
+    Masks are shared by viewers standing on the same cell, and kept for
+    viewers that didn't move until the map changes. For each viewer, it
+    keeps track of the entities it sees, so that each update can report just
+    the ones it didn't see before.
+
+    libtcod lets go of the GIL while computing FOV, so with `workers` above
+    1, masks get computed across a thread pool.
+    """
+    __slots__ = ['world', 'radius', 'light_walls', 'algorithm', 'workers',
+                 '_pool', '_local', '_version', '_masks', '_seen']
+
+    def __init__(self,
+                 world: BaseWorld,
+                 radius: int = None,
+                 light_walls: bool = True,
+                 algorithm: int = tcod.FOV_RESTRICTIVE,
+                 workers: int = 1):
+        """
+        :param world: The world to look at
+        :param radius: Maximum view distance, 0 for unlimited - defaults to
+            the world's VIEW_RADIUS
+        :param light_walls: Whether the walls around visible tiles are visible
+        :param algorithm: One of the tcod.FOV_* constants
+        :param workers: Number of threads to compute FOV with
+        """
+        self.world: BaseWorld = world
+        self.radius: int = world.VIEW_RADIUS if radius is None else radius
+        self.light_walls: bool = light_walls
+        self.algorithm: int = algorithm
+        self.workers: int = workers
+        self._pool: ThreadPoolExecutor = None
+        # Every thread needs its own tcod map, since computing FOV writes
+        # into it
+        self._local: local = local()
+        self._version: int = None
+        self._masks: Dict[Tuple[int, int], np.ndarray] = {}
+        self._seen: Dict[Entity, Set[Entity]] = {}
+
+    def _tcod_map(self) -> tcod.map.Map:
+        map_ = self.world.map
+        cached = getattr(self._local, 'map', None)
+        if cached is None or cached[0] != map_.version:
+            tcod_map = tcod.map.Map(map_.width, map_.height, order='F')
+            tcod_map.transparent[...] = ~map_.blocks_sight
+            cached = self._local.map = (map_.version, tcod_map)
+        return cached[1]
+
+    def _compute(self, where: Tuple[int, int]) -> np.ndarray:
+        tcod_map = self._tcod_map()
+        tcod_map.compute_fov(where[0], where[1], self.radius,
+                             self.light_walls, self.algorithm)
+        return tcod_map.fov.copy()
+
+    def masks(self, viewers: Iterable[Entity]) -> Dict[Entity, np.ndarray]:
+        """
+        Get the boolean visibility mask, indexed [x, y], for every viewer.
+        """
+        map_ = self.world.map
+        if self._version != map_.version:
+            self._masks.clear()
+            self._version = map_.version
+        positions = {
+            viewer: (viewer.location[0], viewer.location[1])
+            for viewer in viewers
+        }
+        wanted = set(positions.values())
+        missing = [
+            where for where in wanted
+            if where not in self._masks
+            and 0 <= where[0] < map_.width and 0 <= where[1] < map_.height
+        ]
+        if self.workers > 1 and len(missing) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers)
+            computed = self._pool.map(self._compute, missing)
+        else:
+            computed = map(self._compute, missing)
+        masks = {where: self._masks[where]
+                 for where in wanted if where in self._masks}
+        masks.update(zip(missing, computed))
+        # Forget masks from cells nobody's standing on any more
+        self._masks = masks
+        blank = np.zeros((map_.width, map_.height), dtype=bool)
+        return {viewer: masks.get(where, blank)
+                for viewer, where in positions.items()}
+
+    @profiled('perception')
+    def update(self,
+               viewers: Iterable[Entity]) -> Dict[Entity, Set[Entity]]:
+        """
+        Look around for every viewer.
+        :return: The entities each viewer sees now, but didn't at the last
+            update
+        """
+        entities: List[Entity] = list(self.world.entity_index)
+        xs = np.fromiter((entity.location[0] for entity in entities),
+                         dtype=np.intp, count=len(entities))
+        ys = np.fromiter((entity.location[1] for entity in entities),
+                         dtype=np.intp, count=len(entities))
+        # Entities can wander off the map, where nobody can see them
+        on_map = ((xs >= 0) & (xs < self.world.map.width)
+                  & (ys >= 0) & (ys < self.world.map.height))
+        if not on_map.all():
+            entities = [entity for entity, inside in zip(entities, on_map)
+                        if inside]
+            xs = xs[on_map]
+            ys = ys[on_map]
+        news = {}
+        seen_now = {}
+        for viewer, mask in self.masks(viewers).items():
+            seen = {entities[i] for i in np.flatnonzero(mask[xs, ys])}
+            seen.discard(viewer)
+            news[viewer] = seen - self._seen.get(viewer, set())
+            seen_now[viewer] = seen
+        # Viewers that weren't asked about this time start from scratch
+        self._seen = seen_now
+        return news
+
+    def seen_by(self, viewer: Entity) -> Set[Entity]:
+        """
+        Get the entities a viewer saw at the last update.
+        """
+        return self._seen.get(viewer, set())
+
+    def close(self):
+        """
+        Shut down the thread pool, if there is one.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,215 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Saving and loading games.
+
+A save is a directory:
+
+- `map.npy` - the map's tile ids
+- `memory_*.npy` - the player's memory layer, if any
+- `records.bin` - everything else, as a stream of pickled records: a header,
+  the world's own state, map overlays, entities and when they act next, and
+  any extra records the game wants to keep (eg. actors)
+
+The arrays are plain .npy files, so they get memory-mapped on load instead
+of read - loading a huge ship doesn't touch most of it until it's needed.
+They're mapped copy-on-write, so changing the loaded map doesn't change the
+save.
+"""
+from __future__ import annotations
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Union, Iterable, List, Any, Type, Tuple, \
+    BinaryIO, Iterator
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .game import BaseWorld
+    from .memory import MemoryLayer
+
+__all__ = ['SAVE_VERSION', 'SaveError', 'save_world', 'load_world',
+           'Autosaver']
+
+SAVE_VERSION = 2
+MAGIC = b'7DTR'
+
+MAP_FILE = 'map.npy'
+RECORDS_FILE = 'records.bin'
+MEMORY_FILES = {
+    'frame': 'memory_frame.npy',
+    'tile_ids': 'memory_tile_ids.npy',
+    'seen': 'memory_seen.npy',
+}
+
+
+class SaveError(ValueError):
+    pass
+
+
+@contextmanager
+def _replacing(path: Path) -> Iterator[BinaryIO]:
+    """
+    Write a file next to `path`, then swap it in, so that a crash halfway
+    through a save doesn't leave a broken one behind.
+    """
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as f:
+        yield f
+    os.replace(temporary, path)
+
+
+def _save_array(path: Path, array: np.ndarray):
+    with _replacing(path) as f:
+        np.save(f, array, allow_pickle=False)
+
+
+def save_world(directory: Union[str, Path],
+               world: BaseWorld,
+               memory: MemoryLayer = None,
+               records: Iterable[Any] = (),
+               save_map: bool = True) -> None:
+    """
+    Save a world, and optionally the player's memory and other records.
+    :param records: Anything else to keep, eg. actors - each one has to be
+        picklable
+    :param save_map: Whether to write the map's tiles; skip it if they
+        didn't change since the last save into the same directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if save_map:
+        _save_array(directory / MAP_FILE, world.map.ids)
+    if memory is not None:
+        for attribute, filename in MEMORY_FILES.items():
+            _save_array(directory / filename, getattr(memory, attribute))
+    with _replacing(directory / RECORDS_FILE) as f:
+        f.write(MAGIC)
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.dump({
+            'version': SAVE_VERSION,
+            'width': world.map.width,
+            'height': world.map.height,
+            'tiles': [tile.name if tile else None
+                      for tile in world.map.tiles.tiles],
+            'memory': memory is not None,
+        })
+        pickler.dump(world.save_state())
+        pickler.dump(dict(world.map.overlays))
+        pickler.dump(len(world.entities))
+        for entity in world.entities:
+            pickler.dump(entity)
+        scheduler = world.scheduler
+        pickler.dump((scheduler.time,
+                      [scheduler.due_time(e) for e in world.entities]))
+        for record in records:
+            pickler.dump(record)
+
+
+def _read_records(f: BinaryIO) -> Iterator[Any]:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SaveError("Not a save file!")
+    unpickler = pickle.Unpickler(f)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+
+def _load_array(path: Path, mmap: bool) -> np.ndarray:
+    return np.load(path, mmap_mode='c' if mmap else None,
+                   allow_pickle=False)
+
+
+def load_world(directory: Union[str, Path],
+               world_class: Type[BaseWorld],
+               memory: MemoryLayer = None,
+               mmap: bool = True) -> Tuple[BaseWorld, List[Any]]:
+    """
+    Load a world saved with `save_world`.
+    :param world_class: Class of the world to create
+    :param memory: Memory layer to load the player's memory into, if any
+    :param mmap: Whether to memory-map the arrays instead of reading them
+    :return: The world and the extra records saved with it
+    """
+    directory = Path(directory)
+    with open(directory / RECORDS_FILE, 'rb') as f:
+        records = _read_records(f)
+        header = next(records)
+        if header['version'] != SAVE_VERSION:
+            raise SaveError(f"Unsupported save version {header['version']}!")
+        world = world_class(header['width'], header['height'])
+        names = [tile.name if tile else None
+                 for tile in world.map.tiles.tiles]
+        if names[:len(header['tiles'])] != header['tiles']:
+            raise SaveError("The save was made with different tiles!")
+        world.load_state(next(records))
+        world.map.overlays.update(next(records))
+        for _ in range(next(records)):
+            world.add_entity(next(records))
+        world.scheduler.time, due_times = next(records)
+        for entity, when in zip(world.entities, due_times):
+            if when is None:
+                world.scheduler.discard(entity)
+            else:
+                world.scheduler.schedule_at(entity, when)
+        extra = list(records)
+
+    ids = _load_array(directory / MAP_FILE, mmap)
+    if ids.shape != (world.map.width, world.map.height):
+        raise SaveError("The saved map has the wrong size!")
+    world.map.load_ids(ids)
+    if memory is not None and header['memory']:
+        for attribute, filename in MEMORY_FILES.items():
+            array = _load_array(directory / filename, mmap)
+            if array.shape[:2] != (memory.width, memory.height):
+                raise SaveError("The saved memory has the wrong size!")
+            setattr(memory, attribute, array)
+    return world, extra
+
+
+class Autosaver:
+    """
+    Saves a world into the same directory over and over, eg. every turn,
+    only rewriting the map when it changed since the last save.
+    """
+    __slots__ = ['directory', '_map', '_map_version']
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory: Path = Path(directory)
+        self._map = None
+        self._map_version: int = None
+
+    def loaded(self, world: BaseWorld):
+        """
+        Note that a world was just loaded from the directory, so its map
+        doesn't need saving until it changes.
+        """
+        self._map = world.map
+        self._map_version = world.map.version
+
+    def save(self, world: BaseWorld, memory: MemoryLayer = None,
+             records: Iterable[Any] = ()):
+        map_changed = (world.map is not self._map
+                       or world.map.version != self._map_version)
+        save_world(self.directory, world, memory, records,
+                   save_map=map_changed)
+        self._map = world.map
+        self._map_version = world.map.version
@@ -0,0 +1,213 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Where the time goes.
+
+Wrap things in `PROFILER.span(name)` to time them:
+
+    with PROFILER.span('fov'):
+        ...
+
+Spans cost next to nothing while the profiler is off, so they can stay in
+the code. Turn it on with `PROFILER.enabled = True` (or F3 in the game) and
+it keeps the spans of the last few hundred frames, to summarize or export
+for chrome://tracing.
+"""
+from __future__ import annotations
+from collections import deque
+from functools import wraps
+from threading import get_ident
+from time import perf_counter_ns
+from typing import Deque, List, Tuple, Dict, Callable, Union, Any
+from pathlib import Path
+import json
+import os
+
+import numpy as np
+
+__all__ = ['Profiler', 'PROFILER', 'profiled']
+
+# name, start and duration in nanoseconds, thread id
+SpanRecord = Tuple[str, int, int, int]
+
+
+class _NullSpan:
+    """
+    What `Profiler.span` hands out while the profiler is off.
+    """
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ['profiler', 'name', 'start']
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler: Profiler = profiler
+        self.name: str = name
+        self.start: int = None
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start,
+                             perf_counter_ns() - self.start)
+        return False
+
+
+class FrameSpan(Span):
+    """
+    A span that also marks the start and end of a frame.
+    """
+    __slots__ = []
+
+    def __enter__(self):
+        self.profiler.end_frame()
+        return super().__enter__()
+
+    def __exit__(self, *exc_info):
+        super().__exit__(*exc_info)
+        self.profiler.end_frame()
+        return False
+
+
+class Profiler:
+    """
+    Collects timed spans, grouped into frames, in a ring buffer of the most
+    recent frames.
+    """
+    __slots__ = ['enabled', 'frames', '_current']
+
+    def __init__(self, frames: int = 300, enabled: bool = False):
+        """
+        :param frames: How many recent frames to keep
+        """
+        self.enabled: bool = enabled
+        self.frames: Deque[List[SpanRecord]] = deque(maxlen=frames)
+        self._current: List[SpanRecord] = None
+
+    def span(self, name: str) -> Union[Span, _NullSpan]:
+        """
+        Time a block of code, as a context manager.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def frame(self, name: str = 'frame') -> Union[Span, _NullSpan]:
+        """
+        Time a whole frame, as a context manager. Spans inside it get
+        grouped with it.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return FrameSpan(self, name)
+
+    def record(self, name: str, start: int, duration: int):
+        if self._current is None:
+            self._current = []
+        self._current.append((name, start, duration, get_ident()))
+
+    def end_frame(self):
+        """
+        Put the spans recorded since the last frame into the ring buffer as
+        a frame of their own.
+        """
+        if self._current:
+            self.frames.append(self._current)
+        self._current = None
+
+    def clear(self):
+        self.frames.clear()
+        self._current = None
+
+    def summary(self) -> Dict[str, Tuple[float, float]]:
+        """
+        Get the median and 99th percentile time per frame spent in each kind
+        of span, in milliseconds, over the frames in the buffer - slowest
+        first.
+        """
+        per_frame: Dict[str, List[int]] = {}
+        for frame in self.frames:
+            totals: Dict[str, int] = {}
+            for name, _, duration, _ in frame:
+                totals[name] = totals.get(name, 0) + duration
+            for name, total in totals.items():
+                per_frame.setdefault(name, []).append(total)
+        summary = {
+            name: tuple(float(ms) for ms in
+                        np.percentile(totals, (50, 99)) / 1e6)
+            for name, totals in per_frame.items()
+        }
+        return dict(sorted(summary.items(), key=lambda item: -item[1][1]))
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        Get the frames in the buffer in the Chrome trace event format, as
+        loaded by chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {
+                    'name': name,
+                    'ph': 'X',
+                    'ts': start / 1000,
+                    'dur': duration / 1000,
+                    'pid': pid,
+                    'tid': thread,
+                }
+                for frame in self.frames
+                for name, start, duration, thread in frame
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def export_chrome_trace(self, path: Union[str, Path]):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: str = None) -> Callable[[Callable], Callable]:
+    """
+    Decorator wrapping every call of a function in a span of the global
+    profiler, named after the function unless given a name.
+    """
+    def decorator(function: Callable) -> Callable:
+        span_name = function.__qualname__ if name is None else name
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            with Span(PROFILER, span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,158 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Sequence, Optional, Tuple
+
+import numpy as np
+import tcod
+
+if TYPE_CHECKING:
+    from .tiles import Tile
+    from .spatial import SpatialIndex
+
+__all__ = ['FRAME_DTYPE', 'blank_frame', 'tile_luts', 'draw_entities',
+           'blit_frame', 'blit_cells']
+
+# A frame is an array of these, indexed [x, y]. The layout is the same as
+# `Console.rgb`, so a frame can be copied into a console in one go.
+FRAME_DTYPE = np.dtype([
+    ('ch', np.int32),
+    ('fg', np.uint8, 3),
+    ('bg', np.uint8, 3),
+])
+
+# The console attribute with the whole tile buffer in that layout - it's
+# had a few names across tcod versions, and older ones don't have it at all
+if hasattr(tcod.console.Console, 'rgb'):
+    _TILES = 'rgb'
+elif hasattr(tcod.console.Console, 'tiles_rgb'):
+    _TILES = 'tiles_rgb'
+else:
+    _TILES = None
+
+
+def blank_frame(width: int, height: int,
+                fg_color: tcod.Color, bg_color: tcod.Color) -> np.ndarray:
+    frame = np.empty((width, height), dtype=FRAME_DTYPE)
+    frame['ch'] = ord(' ')
+    frame['fg'] = tuple(fg_color)
+    frame['bg'] = tuple(bg_color)
+    return frame
+
+
+def tile_luts(palette: Sequence[Optional[Tile]],
+              fg_color: tcod.Color, bg_color: tcod.Color) -> np.ndarray:
+    """
+    Build a lookup table from tile ids to how the tiles should be drawn,
+    falling back to the default colors and a blank for anything a tile
+    doesn't define.
+
+    Indexing the result with `Map.ids` gives the frame of the whole map.
+    """
+    lut = blank_frame(len(palette), 1, fg_color, bg_color)[:, 0]
+    for tile_id, tile in enumerate(palette):
+        if tile is None:
+            continue
+        if tile.character:
+            lut['ch'][tile_id] = tile.character
+        if tile.fg_color:
+            lut['fg'][tile_id] = tuple(tile.fg_color)
+        if tile.bg_color:
+            lut['bg'][tile_id] = tuple(tile.bg_color)
+    return lut
+
+
+def draw_entities(frame: np.ndarray,
+                  entities: SpatialIndex,
+                  visible: np.ndarray,
+                  origin: Tuple[int, int] = (0, 0)) -> None:
+    """
+    Draw visible entities on top of a frame, in place.
+
+    For every cell, the first entity with a character gets drawn, same as the
+    order in `CellContents.entities`.
+    :param frame: The frame to draw on
+    :param entities: Spatial index of entities to draw
+    :param visible: Visibility mask, same shape as the frame
+    :param origin: World coordinates of the frame's upper left corner
+    """
+    ox, oy = origin
+    width, height = frame.shape
+    xs = []
+    ys = []
+    chars = []
+    color_xs = []
+    color_ys = []
+    colors = []
+    for (x, y), cell in entities.cells_in_rect(ox, oy, width, height):
+        x -= ox
+        y -= oy
+        if not visible[x, y]:
+            continue
+        for entity in cell:
+            if entity.character:
+                xs.append(x)
+                ys.append(y)
+                chars.append(entity.character)
+                if entity.color:
+                    color_xs.append(x)
+                    color_ys.append(y)
+                    colors.append(tuple(entity.color))
+                break
+    if xs:
+        frame['ch'][xs, ys] = chars
+    if color_xs:
+        frame['fg'][color_xs, color_ys] = colors
+
+
+def blit_frame(console: tcod.console.Console, frame: np.ndarray,
+               x: int = 0, y: int = 0) -> None:
+    """
+    Copy a frame into an `order='F'` console, clipping it to the console's
+    size.
+    """
+    width = min(frame.shape[0], console.width - x)
+    height = min(frame.shape[1], console.height - y)
+    if width <= 0 or height <= 0:
+        return
+    frame = frame[:width, :height]
+    if _TILES is not None:
+        getattr(console, _TILES)[x:x + width, y:y + height] = frame
+    else:
+        # Older versions of libtcod-cffi don't expose the whole tile buffer
+        console.ch[x:x + width, y:y + height] = frame['ch']
+        console.fg[x:x + width, y:y + height] = frame['fg']
+        console.bg[x:x + width, y:y + height] = frame['bg']
+
+
+def blit_cells(console: tcod.console.Console, frame: np.ndarray,
+               xs: np.ndarray, ys: np.ndarray) -> None:
+    """
+    Copy only the given cells of a frame into an `order='F'` console, at the
+    same coordinates. Cells outside the console are skipped.
+    """
+    inside = (xs < console.width) & (ys < console.height)
+    if not inside.all():
+        xs = xs[inside]
+        ys = ys[inside]
+    cells = frame[xs, ys]
+    if _TILES is not None:
+        getattr(console, _TILES)[xs, ys] = cells
+    else:
+        console.ch[xs, ys] = cells['ch']
+        console.fg[xs, ys] = cells['fg']
+        console.bg[xs, ys] = cells['bg']
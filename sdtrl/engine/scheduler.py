@@ -0,0 +1,172 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Turn scheduling for entities that act on their own.
+"""
+from __future__ import annotations
+from heapq import heappush, heappop, heapify
+from itertools import count
+from typing import TYPE_CHECKING, List, Dict, Optional, Iterator
+
+if TYPE_CHECKING:
+    from .entities import Entity
+    from .game import BaseWorld
+
+__all__ = ['Scheduler']
+
+# Heap entry layout - a list, so that removed entries can be blanked out
+# in place instead of dug out of the heap.
+WHEN, ORDER, ENTITY = 0, 1, 2
+
+
+class Scheduler:
+    """
+    Keeps acting entities in a heap by the time of their next action.
+
+    An entity's `act` returns how long what it did takes, and it gets to act
+    again that much later - fast creatures and quick actions come up more
+    often, same as with an energy system, but without touching every actor
+    every tick. Entities that come due at the same time act in the order
+    they were scheduled in.
+
+    Every action costs O(log n), however many actors there are.
+    """
+    __slots__ = ['time', '_queue', '_entries', '_order', '_acting']
+
+    def __init__(self):
+        self.time: float = 0.0
+        self._queue: List[list] = []
+        self._entries: Dict[Entity, list] = {}
+        self._order: Iterator[int] = count()
+        # The entity whose `act` is running right now, if any
+        self._acting: Optional[Entity] = None
+
+    def schedule(self, entity: Entity, delay: float = 0.0):
+        """
+        Have an entity act `delay` from now, replacing its current place in
+        the queue, if any.
+        """
+        self.schedule_at(entity, self.time + delay)
+
+    def schedule_at(self, entity: Entity, when: float):
+        """
+        Have an entity act at `when`, replacing its current place in the
+        queue, if any.
+        :raises ValueError: if the entity is acting right now, and would get
+            to act again without any time passing
+        """
+        if entity is self._acting and when <= self.time:
+            raise ValueError(
+                f"{entity!r} rescheduled itself {when - self.time} from now, "
+                f"it has to be later than that!"
+            )
+        self.discard(entity)
+        entry = [when, next(self._order), entity]
+        self._entries[entity] = entry
+        heappush(self._queue, entry)
+
+    def discard(self, entity: Entity):
+        """
+        Take an entity out of the queue, if it's in it.
+        """
+        if entity is self._acting:
+            self._acting = None
+        entry = self._entries.pop(entity, None)
+        if entry is not None:
+            entry[ENTITY] = None
+            # Don't let the heap fill up with dead entries
+            # - in place, since `advance` may be holding on to the list
+            if len(self._queue) > 2 * len(self._entries) + 64:
+                self._queue[:] = [e for e in self._queue
+                                  if e[ENTITY] is not None]
+                heapify(self._queue)
+
+    def due_time(self, entity: Entity) -> Optional[float]:
+        """
+        Get when an entity acts next, or None if it isn't scheduled.
+        """
+        entry = self._entries.get(entity)
+        return entry[WHEN] if entry is not None else None
+
+    def next_due(self) -> Optional[float]:
+        """
+        Get the time of the next action, or None if nobody's scheduled.
+        """
+        queue = self._queue
+        while queue and queue[0][ENTITY] is None:
+            heappop(queue)
+        return queue[0][WHEN] if queue else None
+
+    def advance(self, duration: float, world: BaseWorld) -> int:
+        """
+        Move time forward, letting everyone who comes due act.
+
+        An entity whose `act` returns None drops out of the queue; so does
+        one that gets discarded while it's acting, eg. because it died. If
+        `act` raises, the entity keeps its place, and the error goes on to
+        the caller.
+        :param duration: How far to move time forward
+        :param world: The world, passed on to `act`
+        :return: How many actions were taken
+        :raises ValueError: if an entity's action takes no time - it'd get
+            to act again and again forever
+        """
+        until = self.time + duration
+        queue = self._queue
+        entries = self._entries
+        actions = 0
+        while queue:
+            entry = queue[0]
+            entity = entry[ENTITY]
+            if entity is None:
+                heappop(queue)
+                continue
+            if entry[WHEN] > until:
+                break
+            heappop(queue)
+            del entries[entity]
+            self.time = entry[WHEN]
+            self._acting = entity
+            failed = True
+            try:
+                cost = entity.act(world)
+                if cost is not None and cost <= 0:
+                    raise ValueError(
+                        f"{entity!r} took {cost} to act, it has to take "
+                        f"longer than 0!"
+                    )
+                failed = False
+                if (self._acting is entity and cost is not None
+                        and entity not in entries):
+                    self.schedule_at(entity, self.time + cost)
+            finally:
+                # Put it back where it was, unless it went away or found
+                # itself another place
+                if failed and self._acting is entity \
+                        and entity not in entries:
+                    entries[entity] = entry
+                    heappush(queue, entry)
+                self._acting = None
+            actions += 1
+        self.time = until
+        return actions
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,151 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Tuple, List, Set, Iterator
+
+if TYPE_CHECKING:
+    from .entities import Entity
+    from .helpers import Pointlike
+    from .dirty import DirtyRegion
+
+__all__ = ['SpatialIndex']
+
+
+class SpatialIndex:
+    """
+    A spatial hash of entities.
+
+    Entities are kept both per cell, for O(1) lookups of what's standing on a
+    given tile, and per square bucket of `bucket_size` cells, so that
+    rectangle and radius queries only have to look at the buckets they
+    overlap instead of every entity in the world.
+
+    Entities already in the index keep it up to date themselves whenever
+    their `location` is assigned. If given a DirtyRegion, the index marks the
+    cells entities enter and leave in it.
+    """
+    __slots__ = ['bucket_size', 'dirty', '_cells', '_buckets', '_locations']
+
+    def __init__(self, bucket_size: int = 16, dirty: DirtyRegion = None):
+        self.bucket_size: int = bucket_size
+        self.dirty: DirtyRegion = dirty
+        self._cells: Dict[Tuple[int, int], List[Entity]] = {}
+        self._buckets: Dict[Tuple[int, int], Set[Entity]] = {}
+        self._locations: Dict[Entity, Tuple[int, int]] = {}
+
+    def _bucket(self, cell: Tuple[int, int]) -> Tuple[int, int]:
+        return cell[0] // self.bucket_size, cell[1] // self.bucket_size
+
+    def _insert(self, entity: Entity, cell: Tuple[int, int]):
+        self._locations[entity] = cell
+        self._cells.setdefault(cell, []).append(entity)
+        self._buckets.setdefault(self._bucket(cell), set()).add(entity)
+        if self.dirty is not None:
+            self.dirty.mark_cell(*cell)
+
+    def _discard(self, entity: Entity, cell: Tuple[int, int]):
+        in_cell = self._cells[cell]
+        in_cell.remove(entity)
+        if not in_cell:
+            del self._cells[cell]
+        bucket_key = self._bucket(cell)
+        bucket = self._buckets[bucket_key]
+        bucket.discard(entity)
+        if not bucket:
+            del self._buckets[bucket_key]
+        if self.dirty is not None:
+            self.dirty.mark_cell(*cell)
+
+    def add(self, entity: Entity):
+        if entity in self._locations:
+            raise ValueError(f"{entity.name} is already in the index!")
+        self._insert(entity, (entity.location[0], entity.location[1]))
+        entity.index = self
+
+    def remove(self, entity: Entity):
+        self._discard(entity, self._locations.pop(entity))
+        entity.index = None
+
+    def update(self, entity: Entity):
+        """
+        Move an entity to the cell it's currently located at.
+        """
+        old = self._locations[entity]
+        new = (entity.location[0], entity.location[1])
+        if old == new:
+            return
+        self._discard(entity, old)
+        self._insert(entity, new)
+
+    def at(self, coords: Pointlike) -> List[Entity]:
+        """
+        Get entities in a given cell, in the order they were added.
+        """
+        return list(self._cells.get((coords[0], coords[1]), ()))
+
+    def in_rect(self,
+                x: int, y: int,
+                width: int, height: int) -> Iterator[Entity]:
+        """
+        Get entities in the rectangle with the upper left corner at (x, y).
+        """
+        x_end = x + width
+        y_end = y + height
+        bx0, by0 = self._bucket((x, y))
+        bx1, by1 = self._bucket((x_end - 1, y_end - 1))
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                for entity in self._buckets.get((bx, by), ()):
+                    ex, ey = self._locations[entity]
+                    if x <= ex < x_end and y <= ey < y_end:
+                        yield entity
+
+    def cells_in_rect(
+            self,
+            x: int, y: int,
+            width: int, height: int
+    ) -> Iterator[Tuple[Tuple[int, int], List[Entity]]]:
+        """
+        Get occupied cells in a rectangle, along with the entities in them,
+        in the order they were added.
+        """
+        cells = {self._locations[entity]
+                 for entity in self.in_rect(x, y, width, height)}
+        for cell in cells:
+            yield cell, self._cells[cell]
+
+    def in_radius(self, center: Pointlike, radius: int) -> Iterator[Entity]:
+        """
+        Get entities at most `radius` cells (in euclidean distance) away from
+        `center`.
+        """
+        cx, cy = center[0], center[1]
+        radius_squared = radius * radius
+        for entity in self.in_rect(cx - radius, cy - radius,
+                                   2 * radius + 1, 2 * radius + 1):
+            ex, ey = self._locations[entity]
+            if (ex - cx) ** 2 + (ey - cy) ** 2 <= radius_squared:
+                yield entity
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self._locations
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(self._locations)
+
+    def __len__(self) -> int:
+        return len(self._locations)
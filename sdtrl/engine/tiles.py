@@ -15,9 +15,15 @@
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
-from typing import Collection
+from typing import Collection, List, Optional, Dict, Union
+import numpy as np
 import tcod
 
+__all__ = ['Tile', 'TileRegistry', 'TILES', 'TILE_ID_DTYPE']
+
+# Type used for storing tile ids in map arrays.
+TILE_ID_DTYPE = np.uint16
+
 
 class Tile:
     __slots__ = [
@@ -31,8 +37,7 @@ class Tile:
 
         'name',
         'description',
-        'type',
-        'room'
+        'id',
     ]
 
     def __init__(self,
@@ -46,8 +51,7 @@ class Tile:
                  # Visuals
                  character: int = None,
                  fg_color: tcod.Color = None,
-                 bg_color: tcod.Color = None,
-                 room: str = None):
+                 bg_color: tcod.Color = None):
         # Functionality
         self.available_actions = available_actions
         self.walkable = walkable
@@ -55,11 +59,14 @@ class Tile:
 
         # Fluff
         # These are instance variables to handle tiles of the same type that
-        # might look or be functionally different (eg. segments of a table or
-        # bloodstained/normal floors).
+        # might look or be functionally different (eg. segments of a table).
+        # State of single cells (eg. bloodstains, which room a cell is in)
+        # goes in Map overlays instead.
         self.name = name
         self.description = description
-        self.room = room
+
+        # Set when the tile gets registered in a TileRegistry
+        self.id: Optional[int] = None
 
         # Visuals
         self.character = character
@@ -84,3 +91,93 @@ class Tile:
 
     def __str__(self):
         return chr(self.character) if self.character else ' '
+
+
+class TileRegistry:
+    """
+    Defines each kind of tile once, and gives it a small integer id.
+
+    Maps only store these ids, so every cell of the same kind shares a single
+    `Tile`, and generating or saving a map only has to deal with integers.
+    Lookup tables from ids to the tiles' attributes are kept in `luts`, for
+    turning id arrays into attribute arrays.
+
+    Id 0 is reserved for empty cells.
+    """
+    __slots__ = ['tiles', 'luts', '_index']
+
+    def __init__(self):
+        self.tiles: List[Optional[Tile]] = [None]
+        self.luts: Dict[str, np.ndarray] = {}
+        self._index: Dict[tuple, int] = {}
+        self._build_luts()
+
+    @staticmethod
+    def _key(tile: Tile) -> tuple:
+        return (
+            tile.name, tile.description, tuple(tile.available_actions),
+            tile.walkable, tile.blocks_sight, tile.character,
+            tuple(tile.fg_color) if tile.fg_color else None,
+            tuple(tile.bg_color) if tile.bg_color else None,
+        )
+
+    def register(self, tile: Tile) -> int:
+        """
+        Get the id of a kind of tile, registering it if an identical one
+        isn't registered yet.
+        """
+        key = self._key(tile)
+        tile_id = self._index.get(key)
+        if tile_id is None:
+            tile_id = len(self.tiles)
+            if tile_id > np.iinfo(TILE_ID_DTYPE).max:
+                raise OverflowError("Too many kinds of tiles!")
+            tile.id = tile_id
+            self.tiles.append(tile)
+            self._index[key] = tile_id
+            self._build_luts()
+        return tile_id
+
+    def id_of(self, tile: Union[Tile, int, np.ndarray, None]):
+        """
+        Get the id of a tile, registering it if needed. Ids and arrays of ids
+        are passed through as they are.
+        """
+        if tile is None:
+            return 0
+        if isinstance(tile, Tile):
+            return self.register(tile)
+        return tile
+
+    def _build_luts(self):
+        tiles = self.tiles
+        self.luts = {
+            'walkable': np.array(
+                [bool(t and t.walkable) for t in tiles], dtype=bool
+            ),
+            'blocks_sight': np.array(
+                [bool(t and t.blocks_sight) for t in tiles], dtype=bool
+            ),
+            'character': np.array(
+                [(t.character or 0) if t else 0 for t in tiles],
+                dtype=np.int32
+            ),
+            'fg': np.array(
+                [tuple(t.fg_color) if t and t.fg_color else (0, 0, 0)
+                 for t in tiles], dtype=np.uint8
+            ),
+            'bg': np.array(
+                [tuple(t.bg_color) if t and t.bg_color else (0, 0, 0)
+                 for t in tiles], dtype=np.uint8
+            ),
+        }
+
+    def __getitem__(self, tile_id: int) -> Optional[Tile]:
+        return self.tiles[tile_id]
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+
+# The registry maps use unless told otherwise.
+TILES = TileRegistry()
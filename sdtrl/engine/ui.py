@@ -15,15 +15,23 @@
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Callable, Tuple
+from typing import TYPE_CHECKING, Callable, Tuple, Optional, List, Dict
 from collections import OrderedDict
+from time import perf_counter
 
+import numpy as np
 import tcod
-from .helpers import Map, MemorizedCell, GameState
+from .helpers import GameState
+from .loop import FrameClock, LatencyTracker, RateCounter
+from .memory import MemoryLayer
+from .render import tile_luts, draw_entities, blit_cells, blit_frame, \
+    blank_frame
+from .camera import Camera
+from .profiling import PROFILER
 
 if TYPE_CHECKING:
     from .game import BaseGame
-    from .helpers import CellContents
+    from .helpers import Map
     from pathlib import Path
     from .helpers import SplashScreen
 
@@ -31,6 +39,18 @@ if TYPE_CHECKING:
 class UI:
     SCREEN_WIDTH = 80
     SCREEN_HEIGHT = 50
+    # Frames per second while something on the screen is animating
+    FPS = 30
+    # Toggles the profiler and its overlay
+    PROFILE_KEY = tcod.KEY_F3
+    # Width of the profiler overlay, and how many phases it lists
+    PROFILE_OVERLAY_WIDTH = 36
+    PROFILE_OVERLAY_LINES = 10
+    # Seconds between refreshes of the overlay's numbers
+    PROFILE_REFRESH = 1.0
+    # Where to save a Chrome trace of the profiled frames when the profiler
+    # gets switched off, if anywhere
+    PROFILE_TRACE: Path = None
 
     LOGO_HEIGHT = 20
 
@@ -67,23 +87,50 @@ class UI:
         else:
             self.main_menu_options = main_menu_options
 
-        tcod.console_set_custom_font(
-            fontFile=self.FONT.as_posix(),
-            nb_char_horiz=16,
-            nb_char_vertic=16
-        )
+        if not game.headless:
+            tcod.console_set_custom_font(
+                fontFile=self.FONT.as_posix(),
+                nb_char_horiz=16,
+                nb_char_vertic=16
+            )
         self.console: tcod.tcod.console.Console = None
         self.game: BaseGame = game
-        self.memory: Map[List[MemorizedCell]] = None
+        # What the player remembers of the world they're in, out of
+        # `memories` - one per deck, if the game has several
+        self.memory: MemoryLayer = None
+        self.memories: Dict[int, MemoryLayer] = {}
+        # The last frame drawn - screen-sized, indexed by screen coordinates
+        self.frame: np.ndarray = None
+        self.camera: Camera = Camera(self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
+        # The part of the map the last frame showed
+        self._view: Tuple[int, int, int, int] = None
+        self.show_profile: bool = False
+        self._profile_summary: List[Tuple[str, Tuple[float, float]]] = None
+        # When the overlay's numbers were last refreshed, by perf_counter
+        self._profile_refreshed: float = 0.0
+        self._tile_luts: np.ndarray = None
+        self._tile_luts_key: Tuple[int, int] = None
         self.state = GameState.SPLASH
-        self._end_credits = False
+        self.clock = FrameClock(self.FPS, game.TICK_RATE)
+        self.input_latency = LatencyTracker()
+        self.frame_counter = RateCounter()
+        self.tick_counter = RateCounter()
+        # The libtcod credits animation needs a window
+        self._end_credits = game.headless
         self._selected_option_index = 0
         self._longest_option_length = max(
             len(opt) for opt in self.main_menu_options
         )
         self._main_menu_options_tuple = tuple(self.main_menu_options.keys())
+        self._splash_layer: tcod.console.Console = None
+        self._splash_layer_size: Tuple[int, int] = None
 
     def init_root(self) -> tcod.tcod.console.Console:
+        if self.game.headless:
+            self.console = tcod.console.Console(
+                self.SCREEN_WIDTH, self.SCREEN_HEIGHT, order='F'
+            )
+            return self.console
         self.console = tcod.console_init_root(
             w=self.SCREEN_WIDTH,
             h=self.SCREEN_HEIGHT,
@@ -93,87 +140,278 @@ class UI:
         return self.console
 
     def run(self):
-        # self.console.print_box(
-        #     0, self.SCREEN_HEIGHT-(credits_height + 1),
-        #     self.SCREEN_WIDTH, credits_height,
-        #     self.game.SPLASH_SCREEN.get_centered_credits(self.SCREEN_WIDTH),
-        #     fg=tuple(self.game.SPLASH_SCREEN.credits_color),
-        #     bg=(0, 0, 0)
-        # )
+        """
+        The main loop.
+
+        While something on the screen is moving, frames are drawn at FPS and
+        the game gets ticked at its TICK_RATE. Otherwise, the loop blocks
+        until there's input, so an idle game doesn't use any CPU.
+        """
         self.console.clear()
+        key = tcod.Key()
+        mouse = tcod.Mouse()
+        self.draw()
         while not tcod.console_is_window_closed():
+            if self.is_animating():
+                self.clock.wait_for_next_frame()
+                event = tcod.sys_check_for_event(
+                    tcod.EVENT_KEY_PRESS, key, mouse
+                )
+            else:
+                event = tcod.sys_wait_for_event(
+                    tcod.EVENT_KEY_PRESS, key, mouse, False
+                )
+                # Don't make the simulation catch up on the time we slept
+                self.clock.resync()
+            pressed = key if event & tcod.EVENT_KEY_PRESS else None
+            if pressed is not None:
+                self.input_latency.start()
+            pressed = self.handle_profile_key(pressed)
+            with PROFILER.frame():
+                self.update(pressed)
+                self.draw()
+            if pressed is not None:
+                self.input_latency.stop()
+        self.game.end_game()
+
+    def step(self, key: tcod.Key = None, ticks: int = 1):
+        """
+        Run one iteration of the main loop right away, without waiting for
+        input or for the clock - for driving a headless game.
+        :param key: Key to handle, if any
+        :param ticks: How many times to tick the game
+        """
+        key = self.handle_profile_key(key)
+        with PROFILER.frame():
+            if self.state == GameState.SPLASH:
+                if key is not None:
+                    self.handle_splash_screen_keys(key)
+            else:
+                for _ in range(ticks):
+                    with PROFILER.span('tick'):
+                        self.game.tick(key)
+                    self.tick_counter.count()
+                    key = None
+            self.draw()
+
+    @property
+    def fps(self) -> float:
+        return self.frame_counter.per_second
+
+    @property
+    def tps(self) -> float:
+        return self.tick_counter.per_second
+
+    def present(self):
+        """
+        Show the console on the screen.
+        """
+        self.frame_counter.count()
+        if not self.game.headless:
+            tcod.console_flush()
+
+    def is_animating(self) -> bool:
+        """
+        Whether the screen needs redrawing even without any input.
+        """
+        # The profiler overlay keeps changing, and the profiler has nothing
+        # to measure while the loop sleeps
+        if self.show_profile:
+            return True
+        if self.state == GameState.SPLASH:
+            return not self._end_credits
+        return self.game.is_animating()
+
+    def handle_profile_key(self, key: Optional[tcod.Key]
+                           ) -> Optional[tcod.Key]:
+        """
+        Toggle the profiler if the key is PROFILE_KEY. This has to happen
+        between frames, so the last frame gets recorded before the profiler's
+        exported and cleared.
+        :return: The key, or None if the profiler took it
+        """
+        if key is not None and key.vk == self.PROFILE_KEY:
+            self.toggle_profile()
+            return None
+        return key
+
+    def update(self, key: Optional[tcod.Key]):
+        if self.state == GameState.SPLASH:
+            if key is not None:
+                self.handle_splash_screen_keys(key)
+        else:
+            if key is not None:
+                with PROFILER.span('tick'):
+                    self.game.tick(key)
+                self.tick_counter.count()
+            for _ in range(self.clock.ticks_due()):
+                with PROFILER.span('tick'):
+                    self.game.tick()
+                self.tick_counter.count()
+
+    def draw(self):
+        with PROFILER.span('draw'):
             if self.state == GameState.SPLASH:
                 self.draw_splash_screen()
-                self.handle_splash_screen_keys()
             else:
-                self.game.tick()
                 self.draw_game()
-        return
+
+    def toggle_profile(self):
+        """
+        Switch the profiler, and the overlay showing what it found, on or
+        off.
+        """
+        self.show_profile = not self.show_profile
+        PROFILER.enabled = self.show_profile
+        if not self.show_profile:
+            if self.PROFILE_TRACE is not None:
+                PROFILER.export_chrome_trace(self.PROFILE_TRACE)
+            PROFILER.clear()
+        self._profile_summary = None
+        # Draw the whole screen again, to put up or clear the overlay
+        self._view = None
+
+    def draw_profile_overlay(self):
+        """
+        Show the median and 99th percentile time of the slowest phases in
+        the upper left corner of the screen.
+        """
+        width = self.PROFILE_OVERLAY_WIDTH
+        # Summarizing every frame would be most of what gets profiled
+        now = perf_counter()
+        if self._profile_summary is None \
+                or now - self._profile_refreshed >= self.PROFILE_REFRESH:
+            self._profile_summary = list(PROFILER.summary().items())
+            self._profile_refreshed = now
+        lines = [f"{'phase':<16}{'p50 ms':>10}{'p99 ms':>10}"]
+        for name, (p50, p99) in self._profile_summary[
+                :self.PROFILE_OVERLAY_LINES]:
+            lines.append(f"{name[:16]:<16}{p50:>10.2f}{p99:>10.2f}")
+        lines += [''] * (self.PROFILE_OVERLAY_LINES + 1 - len(lines))
+        lines.append(f"{self.fps:.0f} fps, {self.tps:.0f} tps")
+        for y, line in enumerate(lines):
+            self.console.print(0, y, line.ljust(width)[:width],
+                               fg=(255, 255, 255), bg=(0, 0, 64))
 
     def draw_game(self):
-        for y in range(self.game.world.map.height):
-            for x in range(self.game.world.map.width):
-                self.draw_cell(x, y)
-        tcod.console_blit(self.console, 0, 0, self.SCREEN_WIDTH,
-                          self.SCREEN_HEIGHT, self.console, 0, 0)
-        tcod.console_flush()
-
-    def draw_cell(self, x: int, y: int) -> None:
         """
-        Draw a cell from the world and memorize the contents.
+        Redraw the cells on the screen that changed since the last frame, if
+        any - or all of them, if the camera moved.
 
-        If there is nothing in the cell, we will try to remember what was there.
+        Only the part of the map on the screen gets looked at, so big maps
+        don't cost more to draw than small ones.
         """
-        # Defaults, if there is nothing in the cell
-        memorized_tile_name = None
-        ch: int = ord(' ')
-        fg_color: tcod.Color = self.default_fg_color
-        bg_color: tcod.Color = self.default_bg_color
-
-        if self.game.is_visible((x, y)):
-            cell: CellContents = self.game.world @ (x, y)
-            if cell.tile:
-                memorized_tile_name = cell.tile.name
-                if cell.tile.fg_color:
-                    fg_color = cell.tile.fg_color
-                if cell.tile.bg_color:
-                    bg_color = cell.tile.bg_color
-                if cell.tile.character:
-                    ch = cell.tile.character
-            for entity in cell.entities:
-                if entity.character:
-                    # We don't set `ch` here, because we don't want to
-                    # memorize entities.
-                    self.console.ch[x, y] = entity.character
-                    if entity.color:
-                        fg_color = entity.color
-                    break
-            else:
-                self.console.ch[x, y] = ch
-            self.memory[y][x] = MemorizedCell(ch,
-                                              fg_color * 0.5,
-                                              bg_color * 0.5,
-                                              memorized_tile_name)
-        # If the cell isn't visible,
-        else:
-            memorized = self.memory @ (x, y)
-            if memorized:
-                ch, fg_color, bg_color = (
-                    memorized.character, memorized.bg_color, memorized.fg_color
-                )
-                self.console.ch[x, y] = ch
-        self.console.fg[x, y] = fg_color
-        self.console.bg[x, y] = bg_color
+        map_ = self.game.world.map
+        self.camera.follow(self.game.player.location,
+                           map_.width, map_.height)
+        view = self.camera.view(map_.width, map_.height)
+        with PROFILER.span('frame_diff'):
+            diff = self.game.take_frame_diff(view)
+        if view != self._view:
+            with PROFILER.span('compose'):
+                self.compose_frame()
+            with PROFILER.span('blit'):
+                blit_frame(self.console, self.frame)
+        elif diff:
+            xs, ys = diff.cells
+            with PROFILER.span('compose'):
+                self.compose_cells(xs, ys, diff.bounds)
+            with PROFILER.span('blit'):
+                blit_cells(self.console, self.frame,
+                           xs - self.camera.x, ys - self.camera.y)
+        elif not self.show_profile:
+            return
+        if self.show_profile:
+            self.draw_profile_overlay()
+        self.present()
+
+    def compose_frame(self) -> np.ndarray:
+        """
+        Compose the whole frame - the part of the game world in view - from
+        scratch.
+        """
+        map_ = self.game.world.map
+        view = self.camera.view(map_.width, map_.height)
+        x, y, width, height = view
+        xs, ys = np.nonzero(np.ones((width, height), dtype=bool))
+        self.compose_cells(xs + x, ys + y, view)
+        self._view = view
+        return self.frame
+
+    def compose_cells(self, xs: np.ndarray, ys: np.ndarray,
+                      bounds: Tuple[int, int, int, int]) -> None:
+        """
+        Update the given cells of the frame and memorize everything visible
+        among them.
+
+        Visible cells show the map and entities on it, the rest shows what
+        the player remembers being there.
+        :param xs: Map x coordinates of the cells to update, all in view
+        :param ys: Map y coordinates of the cells to update, all in view
+        :param bounds: (x, y, width, height) rectangle holding all the cells
+        """
+        world = self.game.world
+        visible = self.game.visibility_mask()
+        tiles = self.get_tile_luts(world.map)[world.map.ids[xs, ys]]
+        seen = visible[xs, ys]
+        seen_xs = xs[seen]
+        seen_ys = ys[seen]
+        seen_tiles = tiles[seen]
+        # Entities aren't memorized, so this happens before drawing them.
+        self.memory.memorize((seen_xs, seen_ys), seen_tiles,
+                             world.map.ids[seen_xs, seen_ys])
+        cx, cy = self.camera.x, self.camera.y
+        self.frame[xs - cx, ys - cy] = self.memory.frame[xs, ys]
+        self.frame[seen_xs - cx, seen_ys - cy] = seen_tiles
+        # Redrawing entities in the cells around that didn't change is
+        # harmless - they'd get drawn exactly the same.
+        x, y, width, height = bounds
+        draw_entities(self.frame[x - cx:x - cx + width,
+                                 y - cy:y - cy + height],
+                      world.entity_index,
+                      visible[x:x + width, y:y + height],
+                      origin=(x, y))
+
+    def get_tile_luts(self, map_: Map) -> np.ndarray:
+        # Registries only ever grow, so the length tells us if it changed
+        key = (id(map_.tiles), len(map_.tiles))
+        if key != self._tile_luts_key:
+            self._tile_luts = tile_luts(map_.palette,
+                                        self.default_fg_color,
+                                        self.default_bg_color)
+            self._tile_luts_key = key
+        return self._tile_luts
 
     def draw_splash_screen(self):
+        """
+        Draw the splash screen - the cached static layer, then the selected
+        menu option and the libtcod credits animation on top.
+        """
+        self.get_splash_layer().blit(self.console)
+        self.draw_main_menu_option(self._selected_option_index,
+                                   self.LOGO_HEIGHT + 5, frame=False)
+        if not self._end_credits:
+            self._end_credits = tcod.console_credits_render(
+                self.SCREEN_WIDTH - 15, self.SCREEN_HEIGHT - 3, True
+            )
+        self.present()
+
+    def get_splash_layer(self) -> tcod.console.Console:
+        """
+        Get an offscreen console with everything on the splash screen that
+        doesn't change - the logo, the title, the credits, and the menu with
+        nothing selected. Redrawn only if the screen size changes.
+        """
+        size = (self.console.width, self.console.height)
+        if self._splash_layer is not None and self._splash_layer_size == size:
+            return self._splash_layer
+        layer = tcod.console.Console(*size, order='F')
         # title_height = self.console.print_box(
         #     0, 0, self.SCREEN_WIDTH, self.SCREEN_HEIGHT,
         #     self.game.SPLASH_SCREEN.get_centered_title_art(self.SCREEN_WIDTH),
         #     fg=tuple(self.game.SPLASH_SCREEN.title_art_color)
         # )
-        self.console.clear()
-
-        self.draw_title()
+        self.draw_title(layer)
         top_offset = self.LOGO_HEIGHT + 4
         # bottom_offset = self.draw_credits() + 1
         # remaining = self.SCREEN_HEIGHT - top_offset - bottom_offset - 1
@@ -183,31 +421,31 @@ class UI:
         key_hint1 = f"Choose an option with {chr(18)}"
         key_hint2 = ", confirm with the Spacebar or Enter"
         xstart = (self.SCREEN_WIDTH - (len(key_hint1) + len(key_hint2))) // 2
-        self.console.print(
+        layer.print(
             xstart, top_offset,
             key_hint1, fg=(112, 120, 128)
         )
-        self.console.print(
+        layer.print(
             xstart + len(key_hint1), top_offset,
             key_hint2, fg=(112, 120, 128)
         )
-        self.draw_main_menu_options(top_offset + 1)
-        self.draw_credits()
-        if not self._end_credits:
-            self._end_credits = tcod.console_credits_render(
-                self.SCREEN_WIDTH - 15, self.SCREEN_HEIGHT - 3, True
-            )
-        tcod.console_blit(self.console, 0, 0, self.SCREEN_WIDTH,
-                          self.SCREEN_HEIGHT, self.console, 0, 0)
-        tcod.console_flush()
+        for i in range(len(self._main_menu_options_tuple)):
+            self.draw_main_menu_option(i, top_offset + 1, layer,
+                                       highlight=False)
+        self.draw_credits(layer)
+        self._splash_layer = layer
+        self._splash_layer_size = size
+        return layer
 
-    def draw_title(self):
+    def draw_title(self, console: tcod.console.Console = None):
+        if console is None:
+            console = self.console
         logo_width = int(
             (self.SPLASH_SCREEN.logo.width /
              self.SPLASH_SCREEN.logo.height) * self.LOGO_HEIGHT
         )
         self.SPLASH_SCREEN.logo.blit_rect(
-            self.console,
+            console,
             (self.SCREEN_WIDTH - logo_width) // 2, 1,
             logo_width, self.LOGO_HEIGHT,
             tcod.BKGND_SET
@@ -215,7 +453,7 @@ class UI:
         centered_title = self.SPLASH_SCREEN.get_centered_title(
             self.SCREEN_WIDTH
         )
-        self.console.print_box(
+        console.print_box(
             0, self.LOGO_HEIGHT + 2,
             self.SCREEN_WIDTH, centered_title.count('\n') + 1,
             centered_title,
@@ -224,11 +462,13 @@ class UI:
         )
         return self.LOGO_HEIGHT
 
-    def draw_credits(self):
+    def draw_credits(self, console: tcod.console.Console = None):
+        if console is None:
+            console = self.console
         for key, color in self.SPLASH_SCREEN.credits_format_colors.items():
             tcod.console_set_color_control(key, tuple(color), (0, 0, 0))
         credits_height = self.SPLASH_SCREEN.credits.count('\n') + 1
-        self.console.print_box(
+        console.print_box(
             0, self.SCREEN_HEIGHT - (credits_height + 1),
             self.SCREEN_WIDTH, credits_height,
             self.SPLASH_SCREEN.get_centered_credits(self.SCREEN_WIDTH),
@@ -237,46 +477,41 @@ class UI:
         )
         return credits_height
 
-    def draw_main_menu_options(self, yoffset):
-        for i, option in enumerate(self.main_menu_options):
-            fg = self.main_menu_options[option][0]
-            bg = (0, 0, 0)
-            if i == self._selected_option_index:
-                fg, bg = bg, fg
-            yoffset += 1
-            self.console.print_frame(
+    def draw_main_menu_option(self, index: int, yoffset: int,
+                              console: tcod.console.Console = None,
+                              frame: bool = True,
+                              highlight: bool = True):
+        """
+        Draw one of the main menu options.
+        :param yoffset: Where the whole menu starts
+        :param frame: Whether to draw the frame around it too
+        :param highlight: Whether to highlight the option if it's selected
+        """
+        if console is None:
+            console = self.console
+        option = self._main_menu_options_tuple[index]
+        fg = self.main_menu_options[option][0]
+        bg = (0, 0, 0)
+        if highlight and index == self._selected_option_index:
+            fg, bg = bg, fg
+        # Every option takes up 5 rows, with one blank row around them
+        yoffset += 6 * index + 1
+        if frame:
+            console.print_frame(
                 (self.SCREEN_WIDTH - self._longest_option_length - 2) // 2,
                 yoffset,
                 self._longest_option_length + 2,
                 5
             )
-            yoffset += 1
-            self.console.print_box(
-                (self.SCREEN_WIDTH - self._longest_option_length) // 2, yoffset,
-                self._longest_option_length, 1,
-                " " * self._longest_option_length,
-                fg=fg, bg=bg
-            )
-            yoffset += 1
-            self.console.print_box(
-                (self.SCREEN_WIDTH - self._longest_option_length) // 2, yoffset,
-                self._longest_option_length, 1,
-                option.center(self._longest_option_length),
-                fg=fg, bg=bg
+        width = self._longest_option_length
+        for row, text in enumerate(
+                (" " * width, option.center(width), " " * width), 1):
+            console.print_box(
+                (self.SCREEN_WIDTH - width) // 2, yoffset + row,
+                width, 1, text, fg=fg, bg=bg
             )
-            yoffset += 1
-            self.console.print_box(
-                (self.SCREEN_WIDTH - self._longest_option_length) // 2, yoffset,
-                self._longest_option_length, 1,
-                " " * self._longest_option_length,
-                fg=fg, bg=bg
-            )
-            yoffset += 2
 
-    def handle_splash_screen_keys(self):
-        key: tcod.Key = tcod.console_check_for_keypress()
-        if not key:
-            return
+    def handle_splash_screen_keys(self, key: tcod.Key):
         if key.vk == tcod.KEY_DOWN:
             self._selected_option_index = min(
                 len(self._main_menu_options_tuple) - 1,
@@ -294,13 +529,43 @@ class UI:
     def start_game(self):
         self.console.clear()
         self.game.start_game()
-        self.memory = Map(
-            self.game.world.map.width, self.game.world.map.height
-        )
+        self.memories = {}
+        self.frame = blank_frame(self.SCREEN_WIDTH, self.SCREEN_HEIGHT,
+                                 self.default_fg_color,
+                                 self.default_bg_color)
+        self.world_changed()
         self.state = GameState.GAME
 
-    def prewarm_memory(self):
-        ...
+    def world_changed(self):
+        """
+        Switch to remembering the world the game is showing now, and draw
+        all of it again - eg. after the player moved to another deck.
+        """
+        world = self.game.world
+        self.memory = self.memories.get(world.deck)
+        if self.memory is None:
+            self.memory = self.memories[world.deck] = MemoryLayer(
+                world.map.width, world.map.height,
+                self.default_fg_color, self.default_bg_color,
+                tiles=world.map.tiles
+            )
+        self._view = None
+        world.dirty.mark_all()
+
+    def prewarm_memory(self, where: np.ndarray = None):
+        """
+        Make the player remember parts of the map without having seen them,
+        eg. the layout of their own ship.
+        :param where: Boolean mask, indexed [x, y], of the cells to remember.
+            Defaults to every non-empty cell.
+        """
+        map_ = self.game.world.map
+        if where is None:
+            where = map_.ids != 0
+        self.memory.memorize(where,
+                             self.get_tile_luts(map_)[map_.ids[where]],
+                             map_.ids[where])
+        self.game.world.dirty.mark(where)
 
     @staticmethod
     def close_window():
@@ -18,7 +18,11 @@
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 
-from dataclasses import dataclass
+from __future__ import annotations
+from dataclasses import dataclass, astuple
+from typing import Tuple
+
+from .population import ActorPopulation, POPULATION
 
 
 # Citations:
@@ -59,12 +63,83 @@ class Emotion:
 
 
 class Actor:
-    __slots__ = ['emotion', 'personality', '_goal']
+    """
+    A view of one actor in an ActorPopulation.
 
-    def __init__(self, personality: Personality):
-        self.emotion = Emotion(0, 0, 0)
-        self.personality = personality
+    `personality` and `emotion` are read from, and written back to, the
+    population's arrays - change them by assigning new ones, since changing
+    the returned dataclasses in place does nothing.
+
+    Saves hold only the actor's own values. A loaded actor isn't in any
+    population until it gets restored into one, see `attach` and
+    `ActorPopulation.restore`.
+    """
+    __slots__ = ['population', 'slot', '_goal', '_saved']
+
+    def __init__(self, personality: Personality,
+                 population: ActorPopulation = POPULATION):
+        self.population: ActorPopulation = population
+        self.slot: int = population.add(astuple(personality))
         self._goal = None
+        # Personality and emotion of a loaded actor that isn't attached yet
+        self._saved: Tuple[tuple, tuple] = None
+
+    @property
+    def personality(self) -> Personality:
+        return Personality(
+            *self.population.personality[self.slot].tolist()
+        )
+
+    @personality.setter
+    def personality(self, personality: Personality):
+        self.population.personality[self.slot] = astuple(personality)
+
+    @property
+    def emotion(self) -> Emotion:
+        return Emotion(*self.population.emotion[self.slot].tolist())
+
+    @emotion.setter
+    def emotion(self, emotion: Emotion):
+        self.population.emotion[self.slot] = astuple(emotion)
+
+    def remove(self):
+        """
+        Free this actor's slot in the population.
+        """
+        self.population.remove(self.slot)
+
+    def attach(self, population: ActorPopulation = POPULATION):
+        """
+        Give a loaded actor a slot in a population. Does nothing if it's
+        already in one.
+        """
+        if self.population is not None:
+            return
+        personality, emotion = self._saved
+        self.slot = population.add(personality, emotion)
+        self.population = population
+        self._saved = None
+
+    def __getstate__(self):
+        # Saves keep the actor's values, not the whole population
+        if self.population is None:
+            personality, emotion = self._saved
+        else:
+            personality = astuple(self.personality)
+            emotion = astuple(self.emotion)
+        return {
+            'personality': personality,
+            'emotion': emotion,
+            'goal': self._goal,
+        }
+
+    def __setstate__(self, state):
+        # Whoever loaded the actor decides which population it goes in -
+        # taking a slot in POPULATION here would leak one on every load
+        self.population = None
+        self.slot = None
+        self._saved = (tuple(state['personality']), tuple(state['emotion']))
+        self._goal = state['goal']
 
     def act(self): pass
 
@@ -17,19 +17,288 @@
 #
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
-from dataclasses import dataclass
-from typing import Set
+"""
+What actors know.
 
+Knowledge is made of Facts - "subject predicate object, at time", eg.
+Fact('alice', 'saw', 'knife', time=12). Facts are interned, so the same
+fact known by a hundred actors is stored once, and knowledge everyone has
+lives in shared FactStores instead of being copied into every Mind. An
+interned fact is let go of once no store holds it any more.
+"""
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import count
+from sys import intern as intern_string
+from typing import NamedTuple, Hashable, Dict, Set, List, Iterable, \
+    Iterator, Optional, Tuple
 
-@dataclass
-class Fact:
-    ...
+__all__ = ['Fact', 'FactStore', 'Mind', 'ANY', 'intern_fact',
+           'COMMON_KNOWLEDGE']
+
+
+class Fact(NamedTuple):
+    subject: Hashable
+    predicate: str
+    object: Hashable = None
+    # When the fact was true, in game time - None for timeless facts
+    time: Optional[float] = None
+
+
+class _Any:
+    """
+    Matches anything in a query.
+    """
+    __slots__ = []
+
+    def __repr__(self):
+        return 'ANY'
+
+
+ANY = _Any()
+
+# The shared instance of every fact some store holds, and how many stores
+# hold it
+_INTERNED: Dict[Fact, Fact] = {}
+_REFERENCES: Dict[Fact, int] = {}
+
+
+def intern_fact(fact: Fact) -> Fact:
+    """
+    Get the one shared instance of a fact, if any store holds it - or the
+    fact itself, otherwise.
+    """
+    interned = _INTERNED.get(fact)
+    if interned is None:
+        if isinstance(fact.predicate, str):
+            fact = fact._replace(predicate=intern_string(fact.predicate))
+        return fact
+    return interned
+
+
+def _acquire_fact(fact: Fact) -> Fact:
+    fact = intern_fact(fact)
+    _INTERNED[fact] = fact
+    _REFERENCES[fact] = _REFERENCES.get(fact, 0) + 1
+    return fact
+
+
+def _release_fact(fact: Fact):
+    references = _REFERENCES[fact] - 1
+    if references:
+        _REFERENCES[fact] = references
+    else:
+        del _REFERENCES[fact]
+        del _INTERNED[fact]
+
+
+# Every change to any store gets a number from here, so versions from
+# different stores can be compared
+_versions: Iterator[int] = count(1)
+
+
+class FactStore:
+    """
+    A set of facts, indexed by subject, predicate, object and time.
+
+    Queries start from the smallest index that applies, so they cost about
+    as much as the facts they could match, not the size of the store.
+    """
+    __slots__ = ['_facts', '_by_subject', '_by_predicate', '_by_object',
+                 '_by_time', '_times', 'version', '_predicate_versions']
+
+    def __init__(self, facts: Iterable[Fact] = ()):
+        self._facts: Set[Fact] = set()
+        self._by_subject: Dict[Hashable, Set[Fact]] = defaultdict(set)
+        self._by_predicate: Dict[str, Set[Fact]] = defaultdict(set)
+        self._by_object: Dict[Hashable, Set[Fact]] = defaultdict(set)
+        self._by_time: Dict[float, Set[Fact]] = defaultdict(set)
+        # Sorted keys of _by_time, for range queries
+        self._times: List[float] = []
+        # Bumped on every change
+        self.version: int = 0
+        self._predicate_versions: Dict[str, int] = {}
+        for fact in facts:
+            self.add(fact)
+
+    def _indexes(self, fact: Fact) -> Iterator[Tuple[dict, Hashable]]:
+        yield self._by_subject, fact.subject
+        yield self._by_predicate, fact.predicate
+        yield self._by_object, fact.object
+        if fact.time is not None:
+            yield self._by_time, fact.time
+
+    def _changed(self, fact: Fact):
+        self.version = self._predicate_versions[fact.predicate] = \
+            next(_versions)
+
+    def add(self, fact: Fact) -> bool:
+        """
+        :return: Whether the fact is new
+        """
+        if fact in self._facts:
+            return False
+        fact = _acquire_fact(fact)
+        self._facts.add(fact)
+        if fact.time is not None and fact.time not in self._by_time:
+            insort(self._times, fact.time)
+        for index, key in self._indexes(fact):
+            index[key].add(fact)
+        self._changed(fact)
+        return True
+
+    def remove(self, fact: Fact):
+        self._facts.remove(fact)
+        for index, key in self._indexes(fact):
+            facts = index[key]
+            facts.discard(fact)
+            if not facts:
+                del index[key]
+                if index is self._by_time:
+                    del self._times[bisect_left(self._times, key)]
+        _release_fact(fact)
+        self._changed(fact)
+
+    def predicate_version(self, predicate: str) -> int:
+        """
+        Get the version of the store at the last change to facts with a
+        given predicate - 0 if there never were any.
+        """
+        return self._predicate_versions.get(predicate, 0)
+
+    def query(self,
+              subject: Hashable = ANY,
+              predicate: str = ANY,
+              object: Hashable = ANY,
+              since: float = None,
+              until: float = None) -> Set[Fact]:
+        """
+        Find facts matching a pattern. Leave a field out to match anything.
+        :param since: Only match facts from this time or later
+        :param until: Only match facts from this time or earlier
+        """
+        candidates = []
+        for index, key in ((self._by_subject, subject),
+                           (self._by_predicate, predicate),
+                           (self._by_object, object)):
+            if key is not ANY:
+                facts = index.get(key)
+                if not facts:
+                    return set()
+                candidates.append(facts)
+        timed = since is not None or until is not None
+        if timed and (not candidates
+                      or len(candidates[0]) > len(self._times)):
+            # Facts in the time range, from the sorted time keys
+            start = (0 if since is None
+                     else bisect_left(self._times, since))
+            stop = (len(self._times) if until is None
+                    else bisect_right(self._times, until))
+            in_range = set()
+            for time in self._times[start:stop]:
+                in_range.update(self._by_time[time])
+            candidates.append(in_range)
+        if not candidates:
+            return set(self._facts)
+        candidates.sort(key=len)
+        smallest, *others = candidates
+        return {
+            fact for fact in smallest
+            if all(fact in other for other in others)
+            and (not timed or fact.time is not None
+                 and (since is None or fact.time >= since)
+                 and (until is None or fact.time <= until))
+        }
+
+    def __contains__(self, fact: Fact) -> bool:
+        return fact in self._facts
+
+    def __iter__(self) -> Iterator[Fact]:
+        return iter(self._facts)
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def __del__(self):
+        # A store that's gone doesn't hold its facts any more either
+        for fact in self._facts:
+            _release_fact(fact)
+
+
+# What everyone knows
+COMMON_KNOWLEDGE = FactStore()
 
 
-@dataclass
 class Mind:
     """
     An Actor's "brain". Stores knowledge and memory.
+
+    An actor knows the facts in its own store, plus the ones in the shared
+    stores it's part of.
     """
-    __slots__ = ['facts', 'memory']
-    facts: Set
+    __slots__ = ['facts', 'shared', 'memory']
+
+    def __init__(self,
+                 shared: Iterable[FactStore] = (COMMON_KNOWLEDGE,)):
+        self.facts: FactStore = FactStore()
+        self.shared: Tuple[FactStore, ...] = tuple(shared)
+
+    @property
+    def stores(self) -> Tuple[FactStore, ...]:
+        return (self.facts,) + self.shared
+
+    @property
+    def version(self) -> int:
+        """
+        Changes whenever anything this mind knows does.
+        """
+        return max(store.version for store in self.stores)
+
+    def predicate_version(self, predicate: str) -> int:
+        """
+        Changes whenever facts this mind knows with a given predicate do.
+        """
+        return max(store.predicate_version(predicate)
+                   for store in self.stores)
+
+    def learn(self, fact: Fact) -> bool:
+        """
+        :return: Whether the fact was news to this mind
+        """
+        if any(fact in store for store in self.shared):
+            return False
+        return self.facts.add(fact)
+
+    def witness(self, observer: Hashable, seen: Iterable[Hashable],
+                time: float = None) -> int:
+        """
+        Remember seeing things, as `observer saw thing` facts.
+        :return: How many of them were news
+        """
+        return sum(self.learn(Fact(observer, 'saw', thing, time))
+                   for thing in seen)
+
+    def forget(self, fact: Fact):
+        """
+        Forget a fact this mind learned itself. Shared facts can't be
+        forgotten, only removed from their store.
+        """
+        self.facts.remove(fact)
+
+    def knows(self, fact: Fact) -> bool:
+        return any(fact in store for store in self.stores)
+
+    def query(self,
+              subject: Hashable = ANY,
+              predicate: str = ANY,
+              object: Hashable = ANY,
+              since: float = None,
+              until: float = None) -> Set[Fact]:
+        """
+        Find facts this mind knows matching a pattern, see FactStore.query.
+        """
+        found = set()
+        for store in self.stores:
+            found |= store.query(subject, predicate, object, since, until)
+        return found
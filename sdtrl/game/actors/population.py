@@ -0,0 +1,180 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+All actors' personalities and emotions, kept together in arrays so that
+the whole crew's feelings can be updated at once.
+"""
+from __future__ import annotations
+from typing import List, Union, Sequence, Iterable, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .actor import Actor
+
+__all__ = ['ActorPopulation', 'POPULATION', 'PERSONALITY_FACTORS',
+           'EMOTION_AXES']
+
+PERSONALITY_FACTORS = ('openness', 'conscientiousness', 'extraversion',
+                       'agreeableness', 'neuroticism')
+EMOTION_AXES = ('arousal', 'valence', 'certainty')
+OPENNESS, CONSCIENTIOUSNESS, EXTRAVERSION, AGREEABLENESS, NEUROTICISM = \
+    range(len(PERSONALITY_FACTORS))
+
+DTYPE = np.float32
+
+Slots = Union[int, Sequence[int], np.ndarray]
+
+
+class ActorPopulation:
+    """
+    Struct-of-arrays storage for actors.
+
+    Every actor gets a slot - a row in `personality`, an (n, 5) array of the
+    five factors, and in `emotion`, an (n, 3) array of arousal, valence and
+    certainty. Emotions are kept within [-1, 1]. Slots of removed actors get
+    reused.
+
+    The update steps work on every slot at once; dead slots hold zeros, so
+    they don't need skipping.
+    """
+    __slots__ = ['personality', 'emotion', 'alive', 'size', '_free']
+
+    def __init__(self, capacity: int = 64):
+        self.personality: np.ndarray = np.zeros(
+            (capacity, len(PERSONALITY_FACTORS)), dtype=DTYPE
+        )
+        self.emotion: np.ndarray = np.zeros(
+            (capacity, len(EMOTION_AXES)), dtype=DTYPE
+        )
+        self.alive: np.ndarray = np.zeros(capacity, dtype=bool)
+        # Slots past this one were never used
+        self.size: int = 0
+        self._free: List[int] = []
+
+    def add(self, personality: Sequence[float],
+            emotion: Sequence[float] = (0, 0, 0)) -> int:
+        """
+        Add an actor.
+        :return: The actor's slot
+        """
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.size == len(self.alive):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.personality[slot] = personality
+        self.emotion[slot] = emotion
+        self.alive[slot] = True
+        return slot
+
+    def remove(self, slot: int):
+        if not self.alive[slot]:
+            raise KeyError(f"No actor in slot {slot}!")
+        self.alive[slot] = False
+        self.personality[slot] = 0
+        self.emotion[slot] = 0
+        self._free.append(slot)
+
+    def restore(self, actors: Iterable[Actor]):
+        """
+        Give actors loaded from a save slots in this population. Ones that
+        are already in a population are left where they are.
+        """
+        for actor in actors:
+            actor.attach(self)
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self.alive))
+        for name in ('personality', 'emotion', 'alive'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def decay(self, rate: Union[float, np.ndarray], dt: float = 1.0):
+        """
+        Let emotions fade back towards neutral. Neurotic actors hold on to
+        theirs for longer.
+        :param rate: Fraction of an emotion lost per unit of time by an actor
+            with no neuroticism - a number, or one per emotion axis
+        :param dt: How much time passed
+        """
+        emotion = self.emotion[:self.size]
+        neuroticism = self.personality[:self.size, NEUROTICISM, None]
+        keep = np.power(
+            1 - np.asarray(rate, dtype=DTYPE) * (1 - 0.5 * neuroticism), dt
+        )
+        emotion *= keep.astype(DTYPE, copy=False)
+
+    def stimulate(self, slots: Slots, stimulus: Sequence[float]):
+        """
+        Make actors feel something. Neurotic actors feel it more strongly.
+        :param slots: Who's affected - repeats add up
+        :param stimulus: Change in (arousal, valence, certainty), or one per
+            slot
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        gain = 1 + self.personality[slots, NEUROTICISM, None]
+        np.add.at(self.emotion, slots,
+                  np.asarray(stimulus, dtype=DTYPE) * gain)
+        np.clip(self.emotion, -1, 1, out=self.emotion)
+
+    def spread(self, sources: Slots, targets: Slots, strength: float):
+        """
+        Emotional contagion - every target's emotions move towards those of
+        the sources next to it. Extraverts spread their emotions further,
+        agreeable actors catch them more easily.
+
+        Everyone's updated from the same snapshot, so the order of the pairs
+        doesn't matter.
+        :param sources: Slots of the actors being looked at
+        :param targets: Slots of the actors looking, one per source - eg.
+            from pairs of neighbours in the world's spatial index
+        :param strength: How much of the difference gets through, per pair
+        """
+        sources = np.asarray(sources, dtype=np.intp)
+        targets = np.asarray(targets, dtype=np.intp)
+        if not len(sources):
+            return
+        emotion = self.emotion
+        weight = (
+            strength
+            * self.personality[sources, EXTRAVERSION]
+            * self.personality[targets, AGREEABLENESS]
+        )
+        # np.take is quite a bit faster than fancy indexing rows here
+        pull = (np.take(emotion, sources, axis=0)
+                - np.take(emotion, targets, axis=0)) * weight[:, None]
+        # Average over each target's neighbours, so a crowd doesn't push
+        # anyone further than a single neighbour would
+        # (np.add.at would do, but bincount is a lot faster)
+        neighbours = np.maximum(np.bincount(targets, minlength=self.size), 1)
+        for axis in range(len(EMOTION_AXES)):
+            emotion[:self.size, axis] += np.bincount(
+                targets, weights=pull[:, axis], minlength=self.size
+            ) / neighbours
+        np.clip(emotion, -1, 1, out=emotion)
+
+    def __len__(self) -> int:
+        return self.size - len(self._free)
+
+
+# Where actors live unless told otherwise
+POPULATION = ActorPopulation()
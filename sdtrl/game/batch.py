@@ -0,0 +1,147 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Generating ships in bulk, for searching seeds and tuning level design.
+"""
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from itertools import islice
+from typing import NamedTuple, Tuple, Optional, Callable, Iterable, \
+    Iterator, List, Deque
+import os
+import random
+
+import numpy as np
+from engine import Map, TILES
+
+from .shipgen import ShipGenerationError
+from .world import build_ship
+
+__all__ = ['RoomLayout', 'GeneratedShip', 'generate_ship', 'generate_ships']
+
+
+class RoomLayout(NamedTuple):
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+    doors: Tuple[Tuple[int, int], ...]
+
+
+class GeneratedShip(NamedTuple):
+    """
+    A generated ship, stripped down to plain arrays and tuples so that it's
+    cheap to send between processes.
+
+    `ids` are tile ids from the TILES registry, indexed [x, y]. Every process
+    registers the game's tiles in the same order on import, so they mean the
+    same thing everywhere.
+    """
+    seed: int
+    ids: np.ndarray
+    rooms: Tuple[RoomLayout, ...]
+    score: Optional[float] = None
+
+
+def generate_ship(seed: int, width: int, height: int,
+                  score: Callable[[GeneratedShip], float] = None
+                  ) -> Optional[GeneratedShip]:
+    """
+    Generate a single ship from a seed, the same one a World with that seed
+    would generate.
+    :param score: Function rating the ship, if any
+    :return: The ship, or None if no ship could be generated from the seed
+    """
+    map_ = Map(width, height)
+    try:
+        rooms, _ = build_ship(map_, random.Random(seed))
+    except ShipGenerationError:
+        return None
+    ids = map_.ids
+    if len(TILES) <= 256:
+        ids = ids.astype(np.uint8)
+    ship = GeneratedShip(
+        seed=seed,
+        ids=ids,
+        rooms=tuple(
+            RoomLayout(room.name, room.x, room.y, room.width, room.height,
+                       tuple(room.doors))
+            for room in rooms
+        )
+    )
+    if score is not None:
+        ship = ship._replace(score=score(ship))
+    return ship
+
+
+def _generate_ship(args) -> Optional[GeneratedShip]:
+    return generate_ship(*args)
+
+
+def _generate_chunk(seeds: List[int], width: int, height: int,
+                    score: Callable[[GeneratedShip], float] = None
+                    ) -> List[GeneratedShip]:
+    ships = (generate_ship(seed, width, height, score) for seed in seeds)
+    return [ship for ship in ships if ship is not None]
+
+
+def generate_ships(seeds: Iterable[int], width: int, height: int,
+                   score: Callable[[GeneratedShip], float] = None,
+                   workers: int = None,
+                   chunksize: int = 64) -> Iterator[GeneratedShip]:
+    """
+    Generate a ship for every seed, in parallel across a process pool.
+
+    Ships come out in the order of the seeds; seeds no ship could be
+    generated from are skipped.
+    :param score: Function rating each ship, run in the worker processes -
+        it has to be picklable, ie. defined at the top level of a module
+    :param workers: Number of processes, defaults to one per CPU. 1 runs
+        everything in this process instead.
+    :param chunksize: How many seeds to send to a worker at once
+    """
+    if workers == 1:
+        jobs = ((seed, width, height, score) for seed in seeds)
+        results = map(_generate_ship, jobs)
+        yield from (ship for ship in results if ship is not None)
+        return
+
+    # Keep a couple of chunks queued per worker, instead of every seed up
+    # front - `seeds` can be endless, and ships that were never asked for
+    # don't have to pile up in memory
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    seeds = iter(seeds)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending: Deque[Future] = deque()
+    try:
+        while True:
+            while len(pending) < in_flight:
+                chunk = list(islice(seeds, chunksize))
+                if not chunk:
+                    break
+                pending.append(
+                    pool.submit(_generate_chunk, chunk, width, height, score)
+                )
+            if not pending:
+                break
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
@@ -19,9 +19,10 @@ from typing import Union
 
 import tcod
 
-from engine import BaseGame, SplashScreen, Color
-from .world import World
+from engine import BaseGame, SplashScreen, Color, Decks
+from .world import World, ship_decks
 from .entities import Player
+from .mystery import Scenario, generate_mystery
 from .ui import UI
 
 
@@ -30,15 +31,30 @@ class SevenDaysToRigel(BaseGame):
     WORLD_CLASS = World
     WORLD_HEIGHT = 50
     WORLD_WIDTH = 80
+    # Processes to search for a solvable mystery with. Solvable ones turn up
+    # within a few candidates, so starting a pool would cost more than it
+    # saves - more than 1 is for generating mysteries in bulk, offline
+    MYSTERY_WORKERS: int = 1
+    DECK_COUNT: int = 5
+
+    def create_decks(self) -> Decks:
+        return ship_decks(None, self.DECK_COUNT, self.WORLD_WIDTH,
+                          self.WORLD_HEIGHT)
 
     def init_world(self):
-        self.world.generate_map()
+        # Deck generation already generated the map
+        self.mystery: Scenario = generate_mystery(
+            [room.name for room in self.world.rooms],
+            seed=self.world.rng.getrandbits(32),
+            workers=self.MYSTERY_WORKERS
+        )
         self.player = self.create_player_character()
-        self.world.entities.append(self.player)
+        self.world.add_entity(self.player)
 
     def create_player_character(self) -> Player:
+        bridge = self.world.rooms[0]
         return Player(
-            location=(self.world.map.width//2, self.world.map.height//2)
+            location=(bridge.x + bridge.width//2, bridge.y + bridge.height//2)
         )
 
     def handle_keypress(self, key: Union[tcod.Key, None]):
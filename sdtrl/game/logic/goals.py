@@ -15,3 +15,254 @@
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 
+"""
+Goal reasoning on top of kanren, with tabling.
+
+Actors ask the same questions turn after turn, and kanren happily works the
+answers out from scratch every time. A GoalEngine remembers the answers to
+tabled relations - per call pattern - until the facts they were worked out
+from change:
+
+    @tabled('connected_to')
+    def reachable(engine, a, b):
+        c = var()
+        return conde([engine.fact(a, 'connected_to', b)],
+                     [engine.fact(a, 'connected_to', c),
+                      reachable(engine, c, b)])
+
+    engine = GoalEngine(mind)
+    x = var()
+    engine.run(0, x, reachable(engine, 'bridge', x))
+
+A table only depends on the predicates its relation names (and the ones
+of the tabled relations it names), so learning about someone's lunch
+doesn't throw away what an actor worked out about the ship's corridors.
+Tabled relations can be recursive, even over cycles - a table that calls
+itself gets the answers found so far, and gets recomputed until nothing
+new turns up.
+"""
+from __future__ import annotations
+from functools import wraps
+from typing import Callable, Dict, Tuple, Hashable, List, Union, Any, \
+    Iterator, Set
+
+from kanren import run, var, isvar, unify, reify
+
+from engine.profiling import profiled
+from game.actors.mind import ANY, FactStore, Mind
+
+__all__ = ['GoalEngine', 'TabledRelation', 'tabled', 'neq', 'var']
+
+Knowledge = Union[Mind, FactStore]
+Goal = Callable[[dict], Iterator[dict]]
+
+
+def neq(u: Any, v: Any) -> Goal:
+    """
+    A goal that succeeds if `u` and `v` are different - they have to be
+    known by the time it runs, so put it after the goals that bind them.
+    """
+    def neq_goal(s: dict) -> Iterator[dict]:
+        if reify(u, s) != reify(v, s):
+            yield s
+    return neq_goal
+
+
+class TabledRelation:
+    """
+    A relation whose answers get tabled by the GoalEngine it's called with.
+    Made with the `tabled` decorator.
+    """
+
+    def __init__(self, body: Callable[..., Any], predicates: Set[str]):
+        self.body = body
+        self.predicates = frozenset(predicates)
+
+    def __call__(self, engine: GoalEngine, *args) -> Goal:
+        return engine.tabled_goal(self, args)
+
+    def __repr__(self):
+        return f'<tabled relation {self.__name__}>'
+
+
+def tabled(*depends_on: Union[str, TabledRelation]) -> Callable[
+        [Callable[..., Any]], TabledRelation]:
+    """
+    Make a relation tabled.
+    :param depends_on: Predicates the relation reads facts of, and other
+        tabled relations it calls
+    """
+    predicates = set()
+    for dependency in depends_on:
+        if isinstance(dependency, TabledRelation):
+            predicates |= dependency.predicates
+        else:
+            predicates.add(dependency)
+
+    def decorator(body: Callable[..., Any]) -> TabledRelation:
+        return wraps(body)(TabledRelation(body, predicates))
+    return decorator
+
+
+class _Table:
+    __slots__ = ['answers', 'answer_set', 'stamp', 'version', 'complete',
+                 'in_progress', 'reentered', 'tainted']
+
+    def __init__(self, stamp: Tuple[int, ...], version: int):
+        self.answers: List[tuple] = []
+        self.answer_set: Set[tuple] = set()
+        # Versions of the relation's predicates when this was worked out
+        self.stamp: Tuple[int, ...] = stamp
+        # Version of the whole fact base - if that didn't change, there's
+        # no need to look at the predicates
+        self.version: int = version
+        self.complete: bool = False
+        self.in_progress: bool = True
+        # Whether this table got asked for its answers while still being
+        # worked out
+        self.reentered: bool = False
+        # Whether working this out used another unfinished table
+        self.tainted: bool = False
+
+
+class _Placeholder(int):
+    """
+    Stands for the n-th distinct variable in a tabled call.
+    """
+    __slots__ = []
+
+
+def _variant(term: Any, seen: Dict[Any, _Placeholder]) -> Hashable:
+    """
+    Turn a call's arguments into a table key - the same for calls that only
+    differ in what their variables are called.
+    """
+    if isvar(term):
+        if term not in seen:
+            seen[term] = _Placeholder(len(seen))
+        return seen[term]
+    if type(term) is tuple:
+        return ('tuple', tuple(_variant(item, seen) for item in term))
+    return term
+
+
+class GoalEngine:
+    """
+    Runs kanren goals against a Mind or FactStore, tabling the answers of
+    tabled relations.
+    """
+    __slots__ = ['knowledge', '_tables', '_stack', 'hits', 'misses']
+
+    def __init__(self, knowledge: Knowledge):
+        self.knowledge: Knowledge = knowledge
+        self._tables: Dict[Tuple[TabledRelation, Hashable], _Table] = {}
+        # Tables being worked out right now, outermost first
+        self._stack: List[_Table] = []
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def run(self, n: int, x: Any, *goals) -> tuple:
+        """
+        Same as kanren.run.
+        """
+        return run(n, x, *goals)
+
+    def fact(self, subject: Any, predicate: Any, object: Any = None,
+             time: Any = None) -> Goal:
+        """
+        A goal that unifies with facts in the knowledge base, using its
+        indexes for whatever's known when the goal runs.
+        :param time: None to match facts from any time
+        """
+        pattern = (subject, predicate, object)
+        if time is not None:
+            pattern += (time,)
+
+        def fact_goal(s: dict) -> Iterator[dict]:
+            subject_, predicate_, object_ = reify(pattern[:3], s)
+            found = self.knowledge.query(
+                ANY if isvar(subject_) else subject_,
+                ANY if isvar(predicate_) else predicate_,
+                ANY if isvar(object_) else object_,
+            )
+            for fact in found:
+                result = unify(pattern, tuple(fact)[:len(pattern)], s)
+                if result is not False:
+                    yield result
+        return fact_goal
+
+    def _stamp(self, relation: TabledRelation) -> Tuple[int, ...]:
+        return tuple(self.knowledge.predicate_version(predicate)
+                     for predicate in sorted(relation.predicates))
+
+    def _valid(self, relation: TabledRelation, table: _Table) -> bool:
+        if not table.complete:
+            return False
+        if table.version == self.knowledge.version:
+            return True
+        if table.stamp == self._stamp(relation):
+            # Something else changed - remember that it doesn't matter
+            table.version = self.knowledge.version
+            return True
+        return False
+
+    def tabled_goal(self, relation: TabledRelation, args: tuple) -> Goal:
+        def goal(s: dict) -> Iterator[dict]:
+            call = reify(args, s)
+            key = (relation, _variant(call, {}))
+            table = self._tables.get(key)
+            if table is not None and table.in_progress:
+                # A recursive call - hand out what's been found so far, and
+                # everything working on top of this has to be redone
+                table.reentered = True
+                for above in self._stack[self._stack.index(table) + 1:]:
+                    above.tainted = True
+            elif table is not None and self._valid(relation, table):
+                self.hits += 1
+            else:
+                self.misses += 1
+                table = self._solve(relation, key, call)
+            for answer in list(table.answers):
+                result = unify(call, answer, s)
+                if result is not False:
+                    yield result
+        return goal
+
+    @profiled('logic')
+    def _solve(self, relation: TabledRelation, key: Hashable,
+               call: tuple) -> _Table:
+        table = _Table(self._stamp(relation), self.knowledge.version)
+        self._tables[key] = table
+        self._stack.append(table)
+        try:
+            while True:
+                table.reentered = False
+                new = False
+                for answer in run(0, call, relation.body(self, *call)):
+                    if answer not in table.answer_set:
+                        table.answer_set.add(answer)
+                        table.answers.append(answer)
+                        new = True
+                if not (new and table.reentered):
+                    break
+        except BaseException:
+            del self._tables[key]
+            raise
+        finally:
+            self._stack.pop()
+            table.in_progress = False
+        # A table worked out from another unfinished one might be missing
+        # answers - use it for now, but don't keep it
+        table.complete = not table.tainted
+        return table
+
+    def invalidate(self, relation: TabledRelation = None):
+        """
+        Throw tables away by hand - all of them, or just one relation's.
+        Not needed when facts change, only if the relations themselves do.
+        """
+        if relation is None:
+            self._tables.clear()
+        else:
+            for key in [key for key in self._tables if key[0] is relation]:
+                del self._tables[key]
@@ -0,0 +1,270 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Generating the murder.
+
+A candidate scenario is cheap to make up - a crew, a victim, a killer and
+the clues they all leave behind - but most of them can't be solved: some
+innocent with a motive and access to the weapon has no alibi, or the
+killer left no trace at all. So we make up lots of them, in parallel, and
+keep the first one the player can solve from the clues alone.
+
+Solvability is checked with the goal engine, the same way a detective
+would reason: the killer is whoever had a motive and access to the weapon,
+and wasn't seen somewhere else at the time of the murder.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, Future, wait, \
+    FIRST_COMPLETED
+from typing import NamedTuple, Tuple, Optional, Sequence, Set, Dict, \
+    Iterator
+import os
+import random
+
+from kanren import var, lall
+
+from .actors.actor import Personality
+from .actors.mind import Fact, FactStore
+from .logic.goals import GoalEngine, tabled, neq
+
+__all__ = ['CrewMember', 'Scenario', 'MysteryGenerationError',
+           'make_scenario', 'suspects', 'is_solvable', 'generate_mystery']
+
+WEAPONS = ('wrench', 'kitchen knife', 'plasma cutter', 'fire extinguisher',
+           'spanner', 'oxygen tank')
+MOTIVES = ('debt', 'jealousy', 'revenge', 'blackmail', 'mutiny')
+SYLLABLES = ('ka', 'ren', 'so', 'mi', 'ta', 'vel', 'do', 'ri', 'an', 'jo',
+             'li', 'mar', 'ek', 'sa', 'nu', 'bel')
+# Hours in the day the murder happens on
+HOURS = 24
+
+
+class MysteryGenerationError(RuntimeError):
+    pass
+
+
+class CrewMember(NamedTuple):
+    name: str
+    personality: Personality
+
+
+class Scenario(NamedTuple):
+    """
+    A murder, and everything that can be found out about it.
+    """
+    seed: int
+    crew: Tuple[CrewMember, ...]
+    victim: str
+    killer: str
+    weapon: str
+    room: str
+    time: int
+    clues: Tuple[Fact, ...]
+
+
+def _name(rng: random.Random, taken: Set[str]) -> str:
+    while True:
+        name = ''.join(
+            rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))
+        ).capitalize()
+        if name not in taken:
+            taken.add(name)
+            return name
+
+
+def make_scenario(seed: int, rooms: Sequence[str],
+                  crew_size: int = 8) -> Scenario:
+    """
+    Make up a candidate scenario, solvable or not.
+    :param rooms: Names of the rooms on the ship
+    """
+    rng = random.Random(seed)
+    taken = set()
+    crew = tuple(
+        CrewMember(_name(rng, taken),
+                   Personality(*(rng.random() for _ in range(5))))
+        for _ in range(crew_size)
+    )
+    victim = rng.choice(crew)
+    others = [member for member in crew if member is not victim]
+    # Disagreeable, neurotic people are likelier to kill
+    killer = rng.choices(others, weights=[
+        1 + member.personality.neuroticism
+        - member.personality.agreeableness
+        for member in others
+    ])[0]
+    weapon = rng.choice(WEAPONS)
+    room = rng.choice(rooms)
+    time = rng.randrange(HOURS)
+
+    clues = [
+        Fact(victim.name, 'killed_in', room, time),
+        Fact(victim.name, 'killed_with', weapon),
+        Fact(killer.name, 'motive', victim.name),
+        Fact(killer.name, 'had_access', weapon),
+    ]
+    # Where everyone was at the time
+    whereabouts: Dict[str, str] = {killer.name: room}
+    for member in others:
+        if member is not killer:
+            whereabouts[member.name] = rng.choice(rooms)
+        if member is killer:
+            continue
+        if rng.random() < 0.5 - member.personality.agreeableness / 4:
+            clues.append(Fact(member.name, 'motive', victim.name))
+        if rng.random() < 0.4:
+            clues.append(Fact(member.name, 'had_access', weapon))
+        else:
+            clues.append(Fact(member.name, 'had_access',
+                              rng.choice(WEAPONS)))
+    # Someone only gets seen if someone else was in the same room and paid
+    # attention
+    for member in others:
+        witnesses = [
+            other for other in others
+            if other is not member and other is not killer
+            and whereabouts[other.name] == whereabouts[member.name]
+        ]
+        if any(rng.random() < 0.3 + other.personality.conscientiousness / 2
+               for other in witnesses):
+            clues.append(Fact(member.name, 'seen_in',
+                              whereabouts[member.name], time))
+    return Scenario(
+        seed=seed,
+        crew=crew,
+        victim=victim.name,
+        killer=killer.name,
+        weapon=weapon,
+        room=room,
+        time=time,
+        clues=tuple(clues),
+    )
+
+
+@tabled('motive', 'had_access', 'killed_with')
+def capable(engine: GoalEngine, person, victim):
+    weapon = var()
+    return lall(engine.fact(person, 'motive', victim),
+                engine.fact(victim, 'killed_with', weapon),
+                engine.fact(person, 'had_access', weapon))
+
+
+@tabled('seen_in', 'killed_in')
+def alibied(engine: GoalEngine, person, victim):
+    room, elsewhere, time = var(), var(), var()
+    return lall(engine.fact(victim, 'killed_in', room, time),
+                engine.fact(person, 'seen_in', elsewhere, time),
+                neq(room, elsewhere))
+
+
+def suspects(clues: FactStore, victim: str) -> Set[str]:
+    """
+    Work out who could have done it from the clues.
+    """
+    engine = GoalEngine(clues)
+    person = var()
+    return (set(engine.run(0, person, capable(engine, person, victim)))
+            - set(engine.run(0, person, alibied(engine, person, victim))))
+
+
+def is_solvable(scenario: Scenario) -> bool:
+    """
+    Whether the clues point at the killer, and only at the killer.
+    """
+    return suspects(FactStore(scenario.clues),
+                    scenario.victim) == {scenario.killer}
+
+
+def _candidate(seed: int, rooms: Sequence[str],
+               crew_size: int) -> Optional[Scenario]:
+    scenario = make_scenario(seed, rooms, crew_size)
+    return scenario if is_solvable(scenario) else None
+
+
+def generate_mystery(rooms: Sequence[str],
+                     crew_size: int = 8,
+                     seed: int = None,
+                     workers: int = None,
+                     max_candidates: int = 10000) -> Scenario:
+    """
+    Make up candidate scenarios until a solvable one turns up, checking
+    them in parallel across a process pool.
+
+    Candidates come from seeds drawn in order from `seed`, and the first
+    solvable one in that order wins - so the result only depends on the
+    seed, not on which worker happened to finish first. Once one is found,
+    candidates after it get cancelled; only the ones before it still have
+    to finish.
+    :param rooms: Names of the rooms on the ship
+    :param workers: Number of processes, defaults to one per CPU. 1 checks
+        candidates in this process instead.
+    :param max_candidates: How many to try before giving up
+    :raises MysteryGenerationError: if none of the candidates were solvable
+    """
+    rooms = tuple(rooms)
+    seed_rng = random.Random(seed)
+    seeds: Iterator[int] = (seed_rng.getrandbits(32)
+                            for _ in range(max_candidates))
+    if workers == 1:
+        for candidate_seed in seeds:
+            scenario = _candidate(candidate_seed, rooms, crew_size)
+            if scenario is not None:
+                return scenario
+        raise MysteryGenerationError(
+            f"No solvable mystery in {max_candidates} candidates!"
+        )
+
+    # Keep a few candidates queued per worker, instead of the whole lot, so
+    # there's little to cancel
+    in_flight = 4 * (workers or os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending: Dict[Future, int] = {}
+    order = 0
+    best: Tuple[int, Scenario] = None
+    try:
+        while True:
+            while best is None and len(pending) < in_flight:
+                candidate_seed = next(seeds, None)
+                if candidate_seed is None:
+                    break
+                future = pool.submit(_candidate, candidate_seed, rooms,
+                                     crew_size)
+                pending[future] = order
+                order += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                scenario = future.result()
+                if scenario is not None and (best is None
+                                             or index < best[0]):
+                    best = (index, scenario)
+            if best is not None:
+                for future, index in list(pending.items()):
+                    if index > best[0]:
+                        future.cancel()
+                        del pending[future]
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+    if best is None:
+        raise MysteryGenerationError(
+            f"No solvable mystery in {max_candidates} candidates!"
+        )
+    return best[1]
@@ -0,0 +1,399 @@
+#  Copyright (c) Slavfox, 2019.
+
+# This file is part of 7 Days to Rigel.
+#
+# 7 Days to Rigel is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# 7 Days to Rigel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Collection, Tuple, Callable, Sequence, \
+    List, Dict, Optional, Iterator
+import random
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+from engine import Tile, TILES
+
+from .tiles import FLOOR, WALL, DOOR
+
+if TYPE_CHECKING:
+    from engine import Map, Entity
+
+__all__ = ['empty_square_room', 'RoomDefinition', 'Room',
+           'ShipGenerationError', 'ShipGenerator', 'validate_definitions']
+
+INFINITY = float('inf')
+
+
+def empty_square_room(w: int, h: int) -> Sequence[
+    Sequence[Tuple[Tile, Sequence[Entity]]]
+]:
+    room: List[List[Tuple[Tile, List[Entity]]]] = []
+    for rown in range(h):
+        row: List[Tuple[Tile, List[Entity]]] = []
+        for coln in range(w):
+            row.append((TILES[FLOOR], []))
+        room.append(row)
+    return room
+
+
+@dataclass
+class RoomDefinition:
+    name: str
+    allowed_connections: Collection[str]
+    min: int = 0
+    max: int = INFINITY
+    min_dimensions: Tuple[float, float] = (3, 3)
+    max_dimensions: Tuple[float, float] = (INFINITY, INFINITY)
+    gen: Callable[
+        [int, int],
+        Sequence[Sequence[Tuple[Tile, Sequence[Entity]]]]
+    ] = empty_square_room
+    required_connections: Collection[str] = ()
+    # Whether the room can be turned sideways, eg. corridors
+    rotatable: bool = False
+
+    def connects_to(self, other: RoomDefinition) -> bool:
+        return (other.name in self.allowed_connections
+                or self.name in other.allowed_connections)
+
+
+class ShipGenerationError(ValueError):
+    pass
+
+
+class Room:
+    """
+    A room placed on the map. x, y, width and height describe the floor;
+    the walls are around it.
+    """
+    __slots__ = ['definition', 'x', 'y', 'width', 'height',
+                 'connections', 'doors']
+
+    def __init__(self, definition: RoomDefinition):
+        self.definition: RoomDefinition = definition
+        self.x: int = None
+        self.y: int = None
+        self.width: int = None
+        self.height: int = None
+        self.connections: List[Room] = []
+        self.doors: List[Tuple[int, int]] = []
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    def __repr__(self):
+        return (f"Room({self.name!r}, x={self.x}, y={self.y}, "
+                f"width={self.width}, height={self.height})")
+
+
+def validate_definitions(definitions: Sequence[RoomDefinition],
+                         width: int, height: int, root: str) -> None:
+    """
+    Check that a set of room definitions can be fit on a map at all, so that
+    impossible ones get rejected up front instead of failing over and over
+    during placement.
+    :raises ShipGenerationError: With the first problem found
+    """
+    by_name = {definition.name: definition for definition in definitions}
+    if len(by_name) != len(definitions):
+        raise ShipGenerationError("Room names must be unique!")
+    if root not in by_name or by_name[root].max < 1:
+        raise ShipGenerationError(f"There has to be a {root}!")
+    area = 0
+    for definition in definitions:
+        name = definition.name
+        min_w, min_h = definition.min_dimensions
+        max_w, max_h = definition.max_dimensions
+        if definition.min > definition.max:
+            raise ShipGenerationError(f"{name}: min is larger than max!")
+        if min_w < 1 or min_h < 1 or min_w > max_w or min_h > max_h:
+            raise ShipGenerationError(f"{name}: invalid dimensions!")
+        fits = min_w + 2 <= width and min_h + 2 <= height
+        if definition.rotatable:
+            fits |= min_h + 2 <= width and min_w + 2 <= height
+        if not fits:
+            raise ShipGenerationError(f"{name} doesn't fit on the map!")
+        for other in (*definition.allowed_connections,
+                      *definition.required_connections):
+            if other not in by_name:
+                raise ShipGenerationError(f"{name}: unknown room {other}!")
+        for other in definition.required_connections:
+            if by_name[other].max < 1:
+                raise ShipGenerationError(
+                    f"{name} needs a {other}, but there can't be any!"
+                )
+            if definition.min and not definition.connects_to(by_name[other]):
+                raise ShipGenerationError(
+                    f"{name} needs a {other}, but can't connect to it!"
+                )
+        # Rooms share walls, so each one takes up at least its floor plus one
+        # row and column of walls.
+        area += definition.min * (min_w + 1) * (min_h + 1)
+    if area > (width - 1) * (height - 1):
+        raise ShipGenerationError("The required rooms don't fit on the map!")
+    # Every room that has to be there has to be reachable from the root.
+    reachable = {root}
+    queue = deque([by_name[root]])
+    while queue:
+        current = queue.popleft()
+        for other in definitions:
+            if (other.name not in reachable and other.max >= 1
+                    and current.connects_to(other)):
+                reachable.add(other.name)
+                queue.append(other)
+    for definition in definitions:
+        if definition.min and definition.name not in reachable:
+            raise ShipGenerationError(
+                f"{definition.name} can't be connected to the {root}!"
+            )
+
+
+class ShipGenerator:
+    """
+    Generates a ship from room definitions.
+
+    First, the generator decides how many of each room there will be and
+    builds a connectivity graph - a spanning tree over the rooms, using only
+    allowed connections, where every room is connected to the rooms it
+    requires. Then it grows the ship from the root room outwards along the
+    graph, placing every room against the wall of the room it's connected to
+    (sharing that wall), with a door between them. Free space is tracked in
+    boolean arrays, so checking whether a room fits is a couple of slices.
+    """
+
+    def __init__(self, definitions: Sequence[RoomDefinition],
+                 root: str,
+                 rng: random.Random = None,
+                 attempts: int = 20):
+        """
+        :param definitions: Definitions of all the rooms
+        :param root: Name of the room to start from, placed at the bow (the
+            right edge of the map)
+        :param rng: Random number generator to use. Defaults to one seeded
+            from the `random` module, so seeding that still works.
+        :param attempts: How many times to try laying out the rooms before
+            giving up
+        """
+        self.definitions: Sequence[RoomDefinition] = definitions
+        self.root: str = root
+        self.rng: random.Random = (
+            rng if rng is not None else random.Random(random.getrandbits(64))
+        )
+        self.attempts: int = attempts
+
+    def generate(self, map_: Map) -> Tuple[List[Room], List[Entity]]:
+        """
+        Generate a ship on a map.
+        :return: The placed rooms, root first, and the entities the rooms
+            were generated with, already at their locations
+        :raises ShipGenerationError: If the definitions are impossible, or
+            no layout was found in the given number of attempts
+        """
+        validate_definitions(self.definitions, map_.width, map_.height,
+                             self.root)
+        for _ in range(self.attempts):
+            rooms = self.build_graph()
+            if self.place(rooms, map_.width, map_.height):
+                return rooms, self.draw(rooms, map_)
+        raise ShipGenerationError(
+            f"Couldn't lay out the ship in {self.attempts} attempts!"
+        )
+
+    def count(self, definition: RoomDefinition) -> int:
+        most = definition.max
+        if most == INFINITY:
+            most = definition.min + 3
+        return self.rng.randint(definition.min, int(most))
+
+    def build_graph(self) -> List[Room]:
+        rng = self.rng
+        by_name = {d.name: d for d in self.definitions}
+        root = Room(by_name[self.root])
+        pending = [
+            Room(definition)
+            for definition in self.definitions
+            # The root is already there
+            for _ in range(self.count(definition)
+                           - (definition is root.definition))
+        ]
+        rng.shuffle(pending)
+        tree = [root]
+        # Rooms that need a specific neighbour only attach to one; the rest
+        # go wherever they're allowed, preferring rooms with fewer
+        # connections so that the ship spreads out.
+        while pending:
+            still_pending = []
+            for room in pending:
+                required = room.definition.required_connections
+                candidates = [
+                    other for other in tree
+                    if room.definition.connects_to(other.definition)
+                    and (not required or other.name in required)
+                ]
+                if not candidates:
+                    still_pending.append(room)
+                    continue
+                fewest = min(len(other.connections) for other in candidates)
+                parent = rng.choice([
+                    other for other in candidates
+                    if len(other.connections) == fewest
+                ])
+                parent.connections.append(room)
+                room.connections.append(parent)
+                tree.append(room)
+            if len(still_pending) == len(pending):
+                raise ShipGenerationError(
+                    f"Can't connect {still_pending[0].name} to the ship!"
+                )
+            pending = still_pending
+        for room in tree:
+            names = {other.name for other in room.connections}
+            for required in room.definition.required_connections:
+                if required not in names:
+                    raise ShipGenerationError(
+                        f"{room.name} isn't connected to a {required}!"
+                    )
+        return tree
+
+    def dimensions(self, definition: RoomDefinition,
+                   width: int, height: int) -> Iterator[Tuple[int, int]]:
+        """
+        Sizes to try for a room - a random one first, then the smallest.
+        """
+        min_w, min_h = (int(n) for n in definition.min_dimensions)
+        max_w, max_h = definition.max_dimensions
+        max_w = int(min(max_w, width - 2))
+        max_h = int(min(max_h, height - 2))
+        sizes = []
+        if min_w <= max_w and min_h <= max_h:
+            sizes.append((self.rng.randint(min_w, max_w),
+                          self.rng.randint(min_h, max_h)))
+            sizes.append((min_w, min_h))
+        if definition.rotatable:
+            sizes = [(h, w) for w, h in sizes] + sizes
+            self.rng.shuffle(sizes)
+        return iter(sizes)
+
+    def place(self, rooms: List[Room], width: int, height: int) -> bool:
+        rng = self.rng
+        floor = np.zeros((width, height), dtype=bool)
+        walls = np.zeros((width, height), dtype=bool)
+
+        def fits(x: int, y: int, w: int, h: int) -> bool:
+            return (x >= 1 and y >= 1
+                    and x + w + 1 <= width and y + h + 1 <= height
+                    and not floor[x - 1:x + w + 1, y - 1:y + h + 1].any()
+                    and not walls[x:x + w, y:y + h].any())
+
+        def put(room: Room, x: int, y: int, w: int, h: int):
+            room.x, room.y, room.width, room.height = x, y, w, h
+            walls[x - 1:x + w + 1, y - 1:y + h + 1] = True
+            floor[x:x + w, y:y + h] = True
+            walls[x:x + w, y:y + h] = False
+
+        root = rooms[0]
+        for w, h in self.dimensions(root.definition, width, height):
+            # Against the bow, with the wall in the last column
+            x = width - 1 - w
+            ys = list(range(1, height - h))
+            rng.shuffle(ys)
+            y = next((y for y in ys if fits(x, y, w, h)), None)
+            if y is not None:
+                put(root, x, y, w, h)
+                break
+        else:
+            return False
+
+        placed = {root}
+        queue = deque([root])
+        while queue:
+            parent = queue.popleft()
+            for room in parent.connections:
+                if room in placed:
+                    continue
+                if not self.place_next_to(room, parent, fits, put,
+                                          width, height):
+                    return False
+                placed.add(room)
+                queue.append(room)
+        return True
+
+    def place_next_to(self, room: Room, parent: Room,
+                      fits: Callable, put: Callable,
+                      width: int, height: int) -> bool:
+        """
+        Place a room against one of the walls of its parent, sharing it, and
+        put a door in the shared wall.
+        """
+        px, py, pw, ph = parent.x, parent.y, parent.width, parent.height
+        for w, h in self.dimensions(room.definition, width, height):
+            candidates = []
+            for y in range(py - h + 1, py + ph):
+                candidates.append((px - 1 - w, y))
+                candidates.append((px + pw + 1, y))
+            for x in range(px - w + 1, px + pw):
+                candidates.append((x, py - 1 - h))
+                candidates.append((x, py + ph + 1))
+            self.rng.shuffle(candidates)
+            for x, y in candidates:
+                if not fits(x, y, w, h):
+                    continue
+                put(room, x, y, w, h)
+                if x + w < px:
+                    door = (px - 1, self.rng.randrange(max(y, py),
+                                                       min(y + h, py + ph)))
+                elif x > px + pw:
+                    door = (px + pw, self.rng.randrange(max(y, py),
+                                                        min(y + h, py + ph)))
+                elif y + h < py:
+                    door = (self.rng.randrange(max(x, px),
+                                               min(x + w, px + pw)), py - 1)
+                else:
+                    door = (self.rng.randrange(max(x, px),
+                                               min(x + w, px + pw)), py + ph)
+                room.doors.append(door)
+                parent.doors.append(door)
+                return True
+        return False
+
+    def draw(self, rooms: List[Room], map_: Map) -> List[Entity]:
+        """
+        Write the placed rooms onto the map.
+        """
+        entities = []
+        room_overlay = map_.overlay('room')
+        for room in rooms:
+            x, y, w, h = room.x, room.y, room.width, room.height
+            map_[x - 1:x + w + 1, y - 1:y + h + 1] = WALL
+        ids: Dict[int, int] = {}
+        for room in rooms:
+            x, y, w, h = room.x, room.y, room.width, room.height
+            contents = room.definition.gen(w, h)
+            room_ids = np.empty((h, w), dtype=map_.ids.dtype)
+            for row_n, row in enumerate(contents):
+                for col_n, (tile, tile_entities) in enumerate(row):
+                    tile_id = ids.get(id(tile))
+                    if tile_id is None:
+                        tile_id = ids[id(tile)] = map_.tiles.id_of(tile)
+                    room_ids[row_n, col_n] = tile_id
+                    for entity in tile_entities:
+                        entity.location = (x + col_n, y + row_n)
+                        entities.append(entity)
+            map_[x:x + w, y:y + h] = room_ids.T
+            room_overlay.fill(x, y, w, h, room.name)
+        for room in rooms:
+            for door in room.doors:
+                map_[door] = DOOR
+        return entities
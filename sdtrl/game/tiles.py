@@ -14,5 +14,55 @@
 #
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
-from engine import Tile
+from engine import Tile, TILES
+from tcod import Color
 
+# Every kind of tile in the game, registered once. The constants are the
+# tiles' ids, which is all the map stores.
+
+FLOOR_BG_COLOR = Color(29, 31, 33)
+FLOOR_FG_COLOR = Color(40, 42, 46)
+WALL_BG_COLOR = Color(55, 59, 65)
+WALL_FG_COLOR = Color(112, 120, 128) # Color(40, 42, 46)
+VIEWPORT_BG_COLOR = Color(0, 0, 0)
+VIEWPORT_FG_COLOR = Color(112, 120, 128)
+
+FLOOR = TILES.register(Tile(
+    name="Floor",
+    description="Empty floor.",
+    bg_color=FLOOR_BG_COLOR,
+    character=ord('.'),
+    fg_color=FLOOR_FG_COLOR,
+    walkable=True
+))
+
+WALL = TILES.register(Tile(
+    name="Wall",
+    description="The ship's inner structure.",
+    bg_color=WALL_BG_COLOR,
+    character=ord('#'),
+    fg_color=WALL_FG_COLOR,
+    walkable=False,
+    blocks_sight=True
+))
+
+VIEWPORT = TILES.register(Tile(
+    name="Viewport",
+    description="A window to the stars.",
+    bg_color=VIEWPORT_BG_COLOR,
+    character=9,  # ◘
+    fg_color=VIEWPORT_FG_COLOR,
+    walkable=False,
+    blocks_sight=True
+))
+
+
+DOOR = TILES.register(Tile(
+    name="Door",
+    description="A sliding door.",
+    bg_color=FLOOR_BG_COLOR,
+    character=ord('+'),
+    fg_color=WALL_FG_COLOR,
+    walkable=True,
+    blocks_sight=True
+))
@@ -15,140 +15,157 @@
 # You should have received a copy of the GNU General Public License along
 # with 7 Days to Rigel.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
-from typing import TYPE_CHECKING, Iterable, Union, Collection, Tuple, \
-    Callable, Sequence, List
+from itertools import product
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Union, List, Tuple, Dict, Set, \
+    Optional
 import random
-from dataclasses import dataclass
 
-from engine import BaseWorld, Tile, Point
-from tcod import Color
+import numpy as np
+from engine import BaseWorld, Entity, Decks
+from engine.profiling import profiled
+from .shipgen import RoomDefinition, Room, ShipGenerator
+from .tiles import VIEWPORT
 
 if TYPE_CHECKING:
-    from engine import Pointlike, Entity
-
-FLOOR_BG_COLOR = Color(29, 31, 33)
-FLOOR_FG_COLOR = Color(40, 42, 46)
-WALL_BG_COLOR = Color(55, 59, 65)
-WALL_FG_COLOR = Color(112, 120, 128) # Color(40, 42, 46)
-VIEWPORT_BG_COLOR = Color(0, 0, 0)
-VIEWPORT_FG_COLOR = Color(112, 120, 128)
-
-
-def floor_tile(room: str=None):
-    return Tile(
-        name="Floor",
-        description="Empty floor.",
-        bg_color=FLOOR_BG_COLOR,
-        character=ord('.'),
-        fg_color=FLOOR_FG_COLOR,
-        walkable=True,
-        room=room
-    )
-
-def wall_tile():
-    return Tile(
-        name="Wall",
-        description="The ship's inner structure.",
-        bg_color=WALL_BG_COLOR,
-        character=ord('#'),
-        fg_color=WALL_FG_COLOR,
-        walkable=False,
-        blocks_sight=True
-    )
-
-def viewport_tile():
-    return Tile(
-        name="Viewport",
-        description="A window to the stars.",
-        bg_color=VIEWPORT_BG_COLOR,
-        character=9,  # ◘
-        fg_color=VIEWPORT_FG_COLOR,
-        walkable=False,
-        blocks_sight=True
-    )
-
-
-def empty_square_room(w: int, h: int) -> Sequence[
-    Sequence[Tuple[Tile, Sequence[Entity]]]
-]:
-    room: List[List[Tuple[Tile, List[Entity]]]] = []
-    for rown in range(h):
-        row: List[Tuple[Tile, List[Entity]]] = []
-        for coln in range(w):
-            row.append((floor_tile(), []))
-        room.append(row)
-    return room
-
-
-@dataclass
-class RoomDefinition:
-    __slots__ = ['name', 'allowed_connections']
-    name: str
-    allowed_connections: Collection[str]
-    min: int = 0
-    max: int = float('inf')
-    min_dimensions: Tuple[float, float] = (3, 3)
-    max_dimensions: Tuple[float, float] = (float('inf'), float('inf'))
-    gen: Callable[
-        [int, int],
-        Sequence[Sequence[Tuple[Tile, Sequence[Entity]]]]
-    ] = empty_square_room
-    required_connections: Collection[str] = ()
-
-# 7 quarters
-# bridge
-# bar
+    from engine import Pointlike, Map
+    from engine.pathfinding import DistanceField
+
+
+SHIP_ROOMS = (
+    RoomDefinition(
+        name='Bridge',
+        allowed_connections={'Corridor'},
+        required_connections={'Corridor'},
+        min=1, max=1,
+        min_dimensions=(4, 5), max_dimensions=(8, 10)
+    ),
+    RoomDefinition(
+        name='Corridor',
+        allowed_connections={'Bridge', 'Corridor', 'Quarters', 'Bar'},
+        min=2, max=8,
+        min_dimensions=(6, 1), max_dimensions=(24, 1),
+        rotatable=True
+    ),
+    RoomDefinition(
+        name='Quarters',
+        allowed_connections={'Corridor'},
+        required_connections={'Corridor'},
+        min=7, max=7,
+        min_dimensions=(3, 3), max_dimensions=(5, 4),
+        rotatable=True
+    ),
+    RoomDefinition(
+        name='Bar',
+        allowed_connections={'Corridor'},
+        required_connections={'Corridor'},
+        min=1, max=1,
+        min_dimensions=(5, 4), max_dimensions=(9, 7)
+    ),
+)
+
+
+def build_ship(map_: Map,
+               rng: random.Random) -> Tuple[List[Room], List[Entity]]:
+    """
+    Generate the ship's rooms on a map.
+    :return: The rooms, bridge first, and the entities in them
+    """
+    rooms, entities = ShipGenerator(
+        SHIP_ROOMS, root='Bridge', rng=rng
+    ).generate(map_)
+    # The bridge is at the bow; its front wall is one big window.
+    bridge = rooms[0]
+    map_[bridge.x + bridge.width, bridge.y:bridge.y + bridge.height] = VIEWPORT
+    return rooms, entities
 
 
 class World(BaseWorld):
-    def __init__(self, map_width, map_height):
+    def __init__(self, map_width, map_height, seed: int = None):
+        """
+        :param seed: Seed for the world's own random number generator. If
+            not given, one is drawn from the `random` module.
+        """
         super().__init__(map_width, map_height)
+        self.rooms: List[Room] = []
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed: int = seed
+        self.rng: random.Random = random.Random(seed)
+
+    def save_state(self) -> dict:
+        return {
+            'rooms': self.rooms,
+            'seed': self.seed,
+            'rng': self.rng.getstate(),
+        }
+
+    def load_state(self, state: dict):
+        self.rooms = state['rooms']
+        self.seed = state['seed']
+        self.rng.setstate(state['rng'])
+
+    def field_to_room(self, room: Room) -> DistanceField:
+        """
+        Get the distance field towards any of a room's floor, shared by
+        everyone heading there.
+        """
+        return self.pathfinder.field(product(
+            range(room.x, room.x + room.width),
+            range(room.y, room.y + room.height)
+        ))
+
+    def perceive(self) -> Dict[Entity, Set[Entity]]:
+        """
+        Let every entity with a `mind` look around, and remember seeing
+        whoever it didn't see last time.
+        :return: The newly seen entities, per viewer
+        """
+        viewers = [entity for entity in self.entities
+                   if getattr(entity, 'mind', None) is not None]
+        news = self.perception.update(viewers)
+        for viewer, seen in news.items():
+            viewer.mind.witness(viewer.name,
+                                (entity.name for entity in seen),
+                                self.scheduler.time)
+        return news
 
     def get_visible_entities(self, from_: Pointlike) -> Iterable[Entity]:
-        return []
+        return [
+            entity for entity in self.entities_in_view_range(from_)
+            if self.fov.is_visible(from_, entity.location)
+        ]
 
     def is_visible(self,
                    from_: Pointlike, what: Union[Pointlike, Entity]) -> bool:
-        return True  # ToDo
+        if isinstance(what, Entity):
+            what = what.location
+        return self.fov.is_visible(from_, what)
 
+    def visibility_mask(self, from_: Pointlike) -> np.ndarray:
+        return self.fov.compute(from_)
+
+    @profiled('generate')
     def generate_map(self):
-        self.generate_bridge()
-
-    def generate_bridge(self):
-        # Y width of bridge, including walls
-        bridge_width = random.randint(5, 12)
-        upper_right_corner_of_bridge = Point(
-            self.map.width - 2,
-            random.randint(1, self.map.height - bridge_width - 1)
-        )
-        bridge_length = random.randint(4, 8)
-        for y in (upper_right_corner_of_bridge.y - 1,
-                  upper_right_corner_of_bridge.y + bridge_width):
-            for x in range(upper_right_corner_of_bridge.x - bridge_width - 1,
-                           upper_right_corner_of_bridge.x + 1):
-                print(y, x)
-                self.map[y][x] = wall_tile()
-
-        for y in range(upper_right_corner_of_bridge.y,
-                       upper_right_corner_of_bridge.y + bridge_width):
-            for x in range(upper_right_corner_of_bridge.x - bridge_width,
-                           upper_right_corner_of_bridge.x):
-                print(y, x)
-                self.map[y][x] = floor_tile('Bridge')
-        self.map[
-            upper_right_corner_of_bridge.y
-        ][
-            upper_right_corner_of_bridge.x
-        ] = wall_tile()
-        self.map[
-            upper_right_corner_of_bridge.y + bridge_width - 1
-        ][
-            upper_right_corner_of_bridge.x
-        ] = wall_tile()
-        for y in range(upper_right_corner_of_bridge.y + 1,
-                       upper_right_corner_of_bridge.y + bridge_width - 1):
-            self.map[y][upper_right_corner_of_bridge.x] = floor_tile()
-        for y in range(upper_right_corner_of_bridge.y,
-                       upper_right_corner_of_bridge.y + bridge_width):
-            self.map[y][upper_right_corner_of_bridge.x + 1] = viewport_tile()
-        print(self.map)
+        self.rooms, entities = build_ship(self.map, self.rng)
+        for entity in entities:
+            self.add_entity(entity)
+
+
+def ship_decks(directory: Optional[Union[str, Path]], count: int,
+               width: int, height: int, seed: int = None,
+               max_resident: int = 3) -> Decks:
+    """
+    Get a ship with several decks, each generated the first time it's
+    needed. Deck n is always the same for a given seed.
+    :param directory: Where to keep decks that aren't in use, None for a
+        temporary directory
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+
+    def generate(index: int) -> World:
+        deck = World(width, height, seed=hash((seed, index)))
+        deck.generate_map()
+        return deck
+    return Decks(directory, count, generate, World, max_resident)